@@ -5,7 +5,7 @@ Mit Hard Signal Gating und Anti-Signal für Full Navigation
 
 from .analyzer import SPAAnalyzer, SPAAnalysisResult
 from .cookie_handler import CookieHandler
-from .interaction_strategy import InteractionStrategy
+from .interaction_strategy import InteractionStrategy, RESOURCE_STATE_SCRIPT
 from .weights import SIGNAL_WEIGHTS, GATING_MULTIPLIER_NO_HARD_SIGNAL, ANTI_SIGNAL_PENALTY_PER_NAVIGATION
 from .state_independent_model import StateIndependentModel
 from .model_guided_strategy import ModelGuidedStrategy
@@ -15,6 +15,7 @@ __all__ = [
     'SPAAnalysisResult',
     'CookieHandler',
     'InteractionStrategy',
+    'RESOURCE_STATE_SCRIPT',
     'SIGNAL_WEIGHTS',
     'GATING_MULTIPLIER_NO_HARD_SIGNAL',
     'ANTI_SIGNAL_PENALTY_PER_NAVIGATION',
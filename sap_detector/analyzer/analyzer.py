@@ -27,8 +27,21 @@ from .weights import SIGNAL_WEIGHTS
 
 logger = logging.getLogger(__name__)
 
+# Ein evaluate()-Round-Trip für alle Detektoren statt einem pro Detektor
+COMBINED_COLLECT_SCRIPT = (
+    "() => ({"
+    " history: (" + HistoryAPIDetector.COLLECT_SCRIPT + ")(),"
+    " dom: (" + DOMRewritingDetector.COLLECT_SCRIPT + ")(),"
+    " title: (" + TitleChangeDetector.COLLECT_SCRIPT + ")()"
+    " })"
+)
+
+# Vorgefertigte Balken für die Confidence-Anzeige (werden nur geschnitten)
+_BAR_FULL = "█" * 10
+_BAR_EMPTY = "░" * 10
 
-@dataclass
+
+@dataclass(slots=True)
 class SPAAnalysisResult:
     """Gesamtergebnis der SPA-Analyse"""
     is_spa: bool
@@ -51,14 +64,11 @@ class SPAAnalyzer:
     - Anti-Signal für Full Navigation
     """
     
-    # Basis-Gewichte (werden durch Gating modifiziert)
-    SIGNAL_WEIGHTS = {
-        "History-API Navigation": 0.40,      # HARD SIGNAL - höchstes Gewicht
-        "Network Activity Pattern": 0.20,    # Reduziert von 0.30
-        "DOM Rewriting Pattern": 0.20,       # Reduziert von 0.25
-        "Title Change Pattern": 0.10,
-        "Clickable Element Pattern": 0.10,
-    }
+    # Basis-Gewichte (werden durch Gating modifiziert) - zentral in weights.py
+    SIGNAL_WEIGHTS = SIGNAL_WEIGHTS
+    
+    # Signale, die ohne Hard Signal nur anteilig zählen
+    GATED_SIGNALS = frozenset({"DOM Rewriting Pattern", "Network Activity Pattern"})
     
     def __init__(self, page: Page):
         self.page = page
@@ -73,27 +83,27 @@ class SPAAnalyzer:
         self.dom_detector = DOMRewritingDetector()
         self.title_detector = TitleChangeDetector()
         self.clickable_detector = ClickableElementDetector()
-        
-        self.interaction_strategy = InteractionStrategy()
-        self.cookie_handler = CookieHandler()
     
     async def setup(self):
         """Initialisiert alle Detektoren"""
         logger.info("🔧 Initialisiere Detektoren...")
         
         try:
-            await self.cookie_handler.handle_cookies(self.page)
-            await self.cookie_handler.close_popups(self.page)
+            await CookieHandler.handle_cookies(self.page)
+            await CookieHandler.close_popups(self.page)
             
             self._last_url = self.page.url
             
             # Navigation-Tracking für Anti-Signal
             self.page.on("framenavigated", self._on_navigation)
             
-            await self.history_detector.inject_monitors(self.page)
-            await self.dom_detector.inject_observer(self.page)
-            await self.title_detector.inject_observer(self.page)
-            await self.network_detector.setup_listeners(self.page)
+            # Unabhängig voneinander (eigene Flags/Registries) - Roundtrips überlappen
+            await asyncio.gather(
+                self.history_detector.inject_monitors(self.page),
+                self.dom_detector.inject_observer(self.page),
+                self.title_detector.inject_observer(self.page),
+                self.network_detector.setup_listeners(self.page),
+            )
             
             logger.info("✅ Alle Detektoren bereit (v4 - mit Hard Signal Gating)")
             
@@ -125,7 +135,7 @@ class SPAAnalyzer:
             await asyncio.sleep(3)
             
             # Scrolle Seite
-            await self.interaction_strategy.scroll_page(self.page)
+            await InteractionStrategy.scroll_page(self.page)
             
             # Interaktionen mit Click-Windows
             if strategy in ["smart", "random_walk"]:
@@ -201,7 +211,7 @@ class SPAAnalyzer:
     
     async def _navigation_with_windows(self, max_actions: int) -> int:
         """Navigation Test mit Click-Windows"""
-        return await self.interaction_strategy.test_navigation(self.page, max_actions)
+        return await InteractionStrategy.test_navigation(self.page, max_actions)
     
     async def _model_guided_with_windows(self, max_actions: int) -> int:
         """Model-Guided mit Click-Windows"""
@@ -391,9 +401,19 @@ class SPAAnalyzer:
         logger.info("📊 Sammle Daten von allen Detektoren...")
         
         try:
-            await self.history_detector.collect_data(self.page)
-            await self.dom_detector.collect_data(self.page)
-            await self.title_detector.collect_data(self.page)
+            try:
+                data = await self.page.evaluate(COMBINED_COLLECT_SCRIPT)
+            except Exception as e:
+                # Fallback: einzeln sammeln, damit ein Fehler nicht alle Signale kostet
+                logger.debug("Kombinierte Datensammlung fehlgeschlagen: %s", e)
+                data = {}
+            
+            # Unabhängig voneinander - im Fallback überlappen die evaluate()-Aufrufe
+            await asyncio.gather(
+                self.history_detector.collect_data(self.page, data.get('history')),
+                self.dom_detector.collect_data(self.page, data.get('dom')),
+                self.title_detector.collect_data(self.page, data.get('title')),
+            )
             logger.info("✅ Datensammlung abgeschlossen")
         except Exception as e:
             error_msg = f"Datensammlung-Fehler: {e}"
@@ -409,6 +429,7 @@ class SPAAnalyzer:
         logger.info("=" * 60)
         logger.info(f"URL: {self.url}")
         
+        scan_task = None
         try:
             await self.setup()
             
@@ -419,6 +440,8 @@ class SPAAnalyzer:
                 logger.info("ℹ️  Interaktionen übersprungen (--no-interact)")
                 await asyncio.sleep(3)  # Baseline abwarten
             
+            # DOM-Scan läuft parallel zur Datensammlung und den synchronen Analysen
+            scan_task = asyncio.create_task(self.clickable_detector.scan_dom(self.page))
             await self.collect_all_data()
             
             logger.info("\n🔬 Analysiere Signale...")
@@ -441,7 +464,7 @@ class SPAAnalyzer:
             results.append(result4)
             self._print_signal_result(result4)
             
-            result5 = await self.clickable_detector.scan_dom(self.page)
+            result5 = await scan_task
             results.append(result5)
             self._print_signal_result(result5)
             
@@ -449,6 +472,8 @@ class SPAAnalyzer:
             return self._compute_final_result_with_gating(results)
             
         except Exception as e:
+            if scan_task is not None:
+                scan_task.cancel()
             error_msg = f"Kritischer Analyse-Fehler: {e}"
             logger.error(error_msg)
             self.errors.append(error_msg)
@@ -464,7 +489,8 @@ class SPAAnalyzer:
     def _print_signal_result(self, result: DetectionResult):
         """Formatierte Ausgabe eines Signal-Ergebnisses"""
         status = "✅" if result.detected else "❌"
-        confidence_bar = "█" * int(result.confidence * 10) + "░" * (10 - int(result.confidence * 10))
+        filled = int(result.confidence * 10)
+        confidence_bar = _BAR_FULL[:filled] + _BAR_EMPTY[filled:]
         
         print(f"\n{status} {result.signal_name}")
         print(f"   Confidence: [{confidence_bar}] {result.confidence:.2%}")
@@ -503,19 +529,20 @@ class SPAAnalyzer:
         weighted_score = 0.0
         gating_applied = False
         
+        weights = self.SIGNAL_WEIGHTS
         for result in results:
-            weight = self.SIGNAL_WEIGHTS.get(result.signal_name, 0.1)
+            # Nicht erkannte Signale tragen nichts bei - kein Gewicht nötig
+            if not result.detected:
+                continue
             
-            if result.detected:
-                contribution = weight * result.confidence
-                
-                # GATING: Ohne Hard Signal zählen DOM/Network nur 35%
-                if not hard_signal_present:
-                    if result.signal_name in ["DOM Rewriting Pattern", "Network Activity Pattern"]:
-                        contribution *= 0.35
-                        gating_applied = True
-                
-                weighted_score += contribution
+            contribution = weights.get(result.signal_name, 0.1) * result.confidence
+            
+            # GATING: Ohne Hard Signal zählen DOM/Network nur 35%
+            if not hard_signal_present and result.signal_name in self.GATED_SIGNALS:
+                contribution *= 0.35
+                gating_applied = True
+            
+            weighted_score += contribution
         
         if gating_applied:
             logger.info("📉 GATING ANGEWENDET: DOM/Network auf 35% reduziert")
@@ -4,31 +4,108 @@ Automatisches Cookie-Banner Handling
 """
 import asyncio
 import logging
-from playwright.async_api import Page, TimeoutError as PlaywrightTimeout
+import re
+from typing import Dict
+from urllib.parse import urlsplit
+from playwright.async_api import Page
 
 logger = logging.getLogger(__name__)
 
+# Attribute, mit denen gefundene Elemente für den Klick aus Python markiert werden
+COOKIE_TARGET_ATTR = 'data-spa-cookie-target'
+POPUP_TARGET_ATTR = 'data-spa-popup-target'
+
+# EINE querySelectorAll-Abfrage über die Union aller CSS-Selektoren - der sichtbare
+# Treffer des frühesten Selektors ab start gewinnt (wie nacheinander geprüft).
+# Erst ohne CSS-Treffer ein Durchgang über Buttons mit kurzem Text gegen den
+# Keyword-Korpus (statt je Begriff einen :has-text-Selektor), nur innerhalb von
+# Banner-/Dialog-Containern. Der Treffer wird markiert.
+# Rückgabe: [Index, Selektor], [len(selectors), Text] für Keyword-Treffer oder null
+COOKIE_FIND_SCRIPT = """
+([selectors, union, keywords, containers, start, attr]) => {
+    for (const el of document.querySelectorAll('[' + attr + ']')) el.removeAttribute(attr);
+    const isVisible = (el) => {
+        const r = el.getBoundingClientRect();
+        if (r.width <= 0 || r.height <= 0) return false;
+        const st = getComputedStyle(el);
+        return st.visibility !== 'hidden' && st.display !== 'none';
+    };
+    if (start < selectors.length) {
+        let best = -1;
+        let bestEl = null;
+        for (const el of document.querySelectorAll(union)) {
+            const limit = best < 0 ? selectors.length : best;
+            for (let i = start; i < limit; i++) {
+                if (!el.matches(selectors[i])) continue;
+                // Unsichtbare Elemente zählen für keinen Selektor
+                if (isVisible(el)) {
+                    best = i;
+                    bestEl = el;
+                }
+                break;
+            }
+            if (best === start) break;
+        }
+        if (bestEl) {
+            bestEl.setAttribute(attr, '');
+            return [best, selectors[best]];
+        }
+    }
+    if (start > selectors.length) return null;
+    // Keine Links und nur im Banner: "Weiter"/"OK" der Seitennavigation würde wegnavigieren
+    const pattern = new RegExp(keywords, 'i');
+    for (const el of document.querySelectorAll('button, [role="button"]')) {
+        const text = (el.innerText || el.textContent || '').trim();
+        if (!text || text.length > 40) continue;
+        const match = pattern.exec(text);
+        if (!match || !el.closest(containers) || !isVisible(el)) continue;
+        el.setAttribute(attr, '');
+        return [selectors.length, match[0]];
+    }
+    return null;
+}
+"""
+
+# Markiert pro Close-Selektor das erste sichtbare Element (attr = Selektor-Index),
+# ebenfalls über eine Union-Abfrage. Rückgabe: markierte Indizes in Selektor-Reihenfolge
+POPUP_FIND_SCRIPT = """
+([selectors, union, attr]) => {
+    for (const el of document.querySelectorAll('[' + attr + ']')) el.removeAttribute(attr);
+    const found = [];
+    for (const el of document.querySelectorAll(union)) {
+        const i = selectors.findIndex((css, j) => !found.includes(j) && el.matches(css));
+        if (i < 0) continue;
+        const r = el.getBoundingClientRect();
+        const st = getComputedStyle(el);
+        if (r.width <= 0 || r.height <= 0 || st.visibility === 'hidden' || st.display === 'none') continue;
+        el.setAttribute(attr, String(i));
+        found.push(i);
+    }
+    return found.sort((a, b) => a - b);
+}
+"""
+
+
+# Prüft, ob die Seite bereits eine Consent-Entscheidung gespeichert hat
+# (Cookie-Name oder localStorage-Key) - dann gibt es keinen Banner zu klicken
+CONSENT_PROBE_SCRIPT = """
+(keys) => {
+    const names = new Set(document.cookie.split(';').map(c => c.split('=')[0].trim()));
+    if (keys.some(k => names.has(k))) return true;
+    try {
+        return keys.some(k => localStorage.getItem(k) !== null);
+    } catch (e) {
+        return false;
+    }
+}
+"""
+
 
 class CookieHandler:
     """Automatisches Cookie-Banner Handling"""
     
     # Bekannte Cookie-Banner Selektoren
     COOKIE_SELECTORS = [
-        # Allgemeine Begriffe
-        'button:has-text("Accept")',
-        'button:has-text("Akzeptieren")',
-        'button:has-text("Accept all")',
-        'button:has-text("Alle akzeptieren")',
-        'button:has-text("Agree")',
-        'button:has-text("Zustimmen")',
-        'button:has-text("OK")',
-        'button:has-text("Got it")',
-        'button:has-text("Verstanden")',
-        'button:has-text("Allow")',
-        'button:has-text("Erlauben")',
-        'button:has-text("Continue")',
-        'button:has-text("Weiter")',
-        
         # ID-basierte Selektoren
         '#onetrust-accept-btn-handler',
         '#accept-cookies',
@@ -75,6 +152,65 @@ class CookieHandler:
         'a[class*="cookie"]',
     ]
     
+    # Union aller Selektoren für eine einzige Abfrage
+    _PROBE_UNION = ", ".join(COOKIE_SELECTORS)
+    
+    # Zustimmungs-Begriffe auf Buttons/Links (ganze Wörter - "ok" soll nicht in "Cookie" treffen)
+    COOKIE_KEYWORDS = [
+        'accept', 'akzeptieren', 'agree', 'zustimmen', 'ok',
+        'allow', 'erlauben', 'continue', 'weiter',
+        'got it', 'verstanden', 'einverstanden',
+    ]
+    _KEYWORD_PATTERN = r'\b(?:' + '|'.join(COOKIE_KEYWORDS) + r')\b'
+    
+    # Container, in denen die Keyword-Suche Buttons akzeptiert (Consent-Banner/Dialoge)
+    BANNER_CONTAINERS = ', '.join([
+        '[role="dialog"]', '[role="alertdialog"]', '[aria-modal="true"]', 'dialog',
+        '[id*="cookie" i]', '[class*="cookie" i]',
+        '[id*="consent" i]', '[class*="consent" i]',
+        '[id*="gdpr" i]', '[class*="gdpr" i]',
+    ])
+    
+    # Schließen-Buttons von Newsletter-/Modal-Popups
+    CLOSE_SELECTORS = [
+        'button[aria-label*="Close"]',
+        'button[aria-label*="Schließen"]',
+        '.close',
+        '.modal-close',
+        '[class*="close"][class*="button"]',
+        '[data-dismiss="modal"]',
+    ]
+    _CLOSE_UNION = ", ".join(CLOSE_SELECTORS)
+    
+    # Speicherorte einer bereits getroffenen Consent-Entscheidung (OneTrust,
+    # Cookiebot, IAB TCF v2, Osano). OptanonConsent fehlt bewusst - OneTrust
+    # setzt es schon vor der Entscheidung
+    CONSENT_KEYS = [
+        'OptanonAlertBoxClosed',
+        'CookieConsent',
+        'euconsent-v2',
+        '__cmpconsent',
+        'cookieconsent_status',
+    ]
+    
+    # Prozessweit: Host → Playwright-Selektor, der dort zuletzt funktioniert hat
+    _HIT_CACHE: Dict[str, str] = {}
+    
+    # Suchrunden und Pause dazwischen (Banner erscheinen oft verzögert)
+    MAX_POLLS = 3
+    POLL_INTERVAL_SEC = 0.5
+    
+    @staticmethod
+    def _cache_selector(index: int, label: str) -> str:
+        """Playwright-Selektor für einen Treffer von COOKIE_FIND_SCRIPT (Keyword oder CSS)"""
+        if index < len(CookieHandler.COOKIE_SELECTORS):
+            return label
+        # Label als Regex-Literal; Backslashes und Quotes zusätzlich für den
+        # Selektor-String escapen, sonst liest Playwright sie als String-Escape
+        pattern = re.escape(label.lower()).replace('\\', '\\\\').replace('"', '\\"')
+        return (f':is({CookieHandler.BANNER_CONTAINERS}) :is(button, [role="button"])'
+                f':text-matches("(^|[^a-z]){pattern}([^a-z]|$)", "i")')
+    
     @staticmethod
     async def handle_cookies(page: Page, timeout: int = 5000) -> bool:
         """
@@ -83,23 +219,59 @@ class CookieHandler:
         """
         try:
             logger.info("ðŸª Suche nach Cookie-Banner...")
-            await asyncio.sleep(1)
             
-            for selector in CookieHandler.COOKIE_SELECTORS:
+            # Consent schon gespeichert (z.B. im wiederverwendeten Context): nichts zu tun
+            try:
+                if await page.evaluate(CONSENT_PROBE_SCRIPT, CookieHandler.CONSENT_KEYS):
+                    logger.info("Cookie-Consent bereits gespeichert - Banner-Suche übersprungen")
+                    return False
+            except Exception as e:
+                logger.debug("Consent-Prüfung fehlgeschlagen: %s", e)
+            
+            # Bekannter Host: erst den dort erfolgreichen Selektor direkt versuchen
+            host = urlsplit(page.url).hostname
+            cached = CookieHandler._HIT_CACHE.get(host)
+            if cached:
                 try:
-                    element = await page.wait_for_selector(selector, timeout=1000, state='visible')
-                    
-                    if element:
-                        await element.click(timeout=2000)
-                        logger.info(f"âœ… Cookie-Banner akzeptiert (Selector: {selector})")
-                        await asyncio.sleep(1)
-                        return True
-                        
-                except PlaywrightTimeout:
-                    continue
+                    # Locator-Klick wartet selbst auf Sichtbarkeit: ein Roundtrip, kein ElementHandle
+                    await page.locator(cached).first.click(timeout=1000)
+                    logger.info("âœ… Cookie-Banner akzeptiert (Selector aus Cache: %s)", cached)
+                    await asyncio.sleep(1)
+                    return True
                 except Exception as e:
-                    logger.debug(f"Cookie-Klick fehlgeschlagen fÃ¼r {selector}: {e}")
+                    logger.debug("Gecachter Cookie-Selektor ohne Treffer (%s): %s", cached, e)
+            
+            # Alle Selektoren pro Runde in einem Browser-Roundtrip prüfen statt
+            # bis zu 1s wait_for_selector je Selektor. Mehrere kurze Runden,
+            # falls der Banner erst nach dem Load eingeblendet wird
+            start = 0  # CSS-Selektoren ab start, danach (start <= len) der Keyword-Durchgang
+            polls = 0
+            while polls < CookieHandler.MAX_POLLS:
+                hit = await page.evaluate(
+                    COOKIE_FIND_SCRIPT,
+                    [CookieHandler.COOKIE_SELECTORS, CookieHandler._PROBE_UNION,
+                     CookieHandler._KEYWORD_PATTERN, CookieHandler.BANNER_CONTAINERS,
+                     start, COOKIE_TARGET_ATTR]
+                )
+                if hit is None:
+                    polls += 1
+                    if polls < CookieHandler.MAX_POLLS:
+                        await asyncio.sleep(CookieHandler.POLL_INTERVAL_SEC)
                     continue
+                
+                index, label = hit
+                selector = label if index < len(CookieHandler.COOKIE_SELECTORS) else f'Text "{label}"'
+                try:
+                    await page.click(f'[{COOKIE_TARGET_ATTR}]', timeout=2000)
+                    if host:
+                        CookieHandler._HIT_CACHE[host] = CookieHandler._cache_selector(index, label)
+                    logger.info("âœ… Cookie-Banner akzeptiert (Selector: %s)", selector)
+                    await asyncio.sleep(1)
+                    return True
+                except Exception as e:
+                    # Wie bisher: mit dem nächsten Selektor weitermachen
+                    logger.debug("Cookie-Klick fehlgeschlagen fÃ¼r %s: %s", selector, e)
+                    start = index + 1
             
             logger.info("â„¹ï¸  Kein Cookie-Banner gefunden (oder bereits akzeptiert)")
             return False
@@ -112,24 +284,20 @@ class CookieHandler:
     async def close_popups(page: Page):
         """SchlieÃŸt zusÃ¤tzliche Popups (Newsletter, etc.)"""
         try:
-            close_selectors = [
-                'button[aria-label*="Close"]',
-                'button[aria-label*="SchlieÃŸen"]',
-                '.close',
-                '.modal-close',
-                '[class*="close"][class*="button"]',
-                '[data-dismiss="modal"]',
-            ]
+            # Ein Roundtrip findet alle Kandidaten, statt bis zu 1s je Selektor zu warten
+            indices = await page.evaluate(
+                POPUP_FIND_SCRIPT,
+                [CookieHandler.CLOSE_SELECTORS, CookieHandler._CLOSE_UNION, POPUP_TARGET_ATTR]
+            )
             
-            for selector in close_selectors:
+            for index in indices:
+                selector = CookieHandler.CLOSE_SELECTORS[index]
                 try:
-                    element = await page.wait_for_selector(selector, timeout=1000, state='visible')
-                    if element:
-                        await element.click(timeout=2000)
-                        logger.info(f"âœ… Popup geschlossen: {selector}")
-                        await asyncio.sleep(0.5)
-                except:
+                    await page.click(f'[{POPUP_TARGET_ATTR}="{index}"]', timeout=2000)
+                    logger.info("âœ… Popup geschlossen: %s", selector)
+                    await asyncio.sleep(0.5)
+                except Exception:
                     continue
                     
         except Exception as e:
-            logger.debug(f"Popup-Close Fehler: {e}")
\ No newline at end of file
+            logger.debug("Popup-Close Fehler: %s", e)
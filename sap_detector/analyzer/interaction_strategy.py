@@ -8,9 +8,8 @@ FIXES:
 3. Links werden nur geklickt wenn sie SPA-like aussehen
 """
 import asyncio
-import random
 import logging
-from playwright.async_api import Page, TimeoutError as PlaywrightTimeout
+from playwright.async_api import Page
 from .model_guided_strategy import ModelGuidedStrategy
 
 logger = logging.getLogger(__name__)
@@ -74,6 +73,34 @@ NAVIGATION_GUARD_SCRIPT = """
 """
 
 
+# True, wenn Scrollen etwas nachladen könnte: Seite höher als der Viewport
+# UND Lazy-Load-Markup (native loading="lazy" oder gängige Lazy-Loader-Attribute)
+LAZY_LOAD_HINT_SCRIPT = """
+() => {
+    const root = document.scrollingElement || document.documentElement;
+    if (!root || root.scrollHeight <= window.innerHeight) return false;
+    return !!document.querySelector(
+        'img[loading="lazy"], iframe[loading="lazy"], [data-src], [data-srcset], ' +
+        '[data-lazy], [data-lazy-src], .lazy, .lazyload'
+    );
+}
+"""
+
+# [Anzahl Resource-Timing-Einträge, ms seit der zuletzt ABGESCHLOSSENEN Ressource,
+#  Dokument fertig geladen] - auch für die Ruhe-Erkennung nach dem Load (main.py).
+# Einträge sind nach startTime sortiert - daher das Maximum von responseEnd
+RESOURCE_STATE_SCRIPT = """
+() => {
+    const entries = performance.getEntriesByType('resource');
+    let lastEnd = 0;
+    for (const e of entries) {
+        if (e.responseEnd > lastEnd) lastEnd = e.responseEnd;
+    }
+    return [entries.length, performance.now() - lastEnd, document.readyState === 'complete'];
+}
+"""
+
+
 class InteractionStrategy:
     """Robuste Interaktionsstrategien für beliebige Websites"""
     
@@ -87,185 +114,34 @@ class InteractionStrategy:
             logger.debug(f"Navigation Guard Injection übersprungen: {e}")
     
     @staticmethod
-    async def smart_random_walk(page: Page, max_actions: int = 10) -> int:
+    async def _wait_for_new_resources(page: Page, before: int, max_ms: int = 1500,
+                                      grace_ms: int = 300, quiet_ms: int = 300,
+                                      poll_ms: int = 100):
         """
-        Intelligenter Random-Walk mit Fehlerbehandlung
-        WICHTIG: Bevorzugt SPA-typische Elemente
-        Returns: Anzahl erfolgreicher Aktionen
-        """
-        actions_performed = 0
-        failed_attempts = 0
-        max_failures = 5
-        
-        # Injiziere Navigation Guard
-        await InteractionStrategy.inject_navigation_guard(page)
-        
-        logger.info(f"🎮 Starte Smart Random-Walk (max {max_actions} Aktionen)...")
-        
-        for i in range(max_actions):
-            if failed_attempts >= max_failures:
-                logger.warning(f"⚠️  Zu viele fehlgeschlagene Versuche ({failed_attempts}), breche ab")
-                break
-            
-            try:
-                # Finde klickbare Elemente - BEVORZUGE SPA-TYPISCHE!
-                clickables = await page.evaluate("""
-                    () => {
-                        const currentHostname = window.location.hostname;
-                        const currentOrigin = window.location.origin;
-                        
-                        // SPA-typische Elemente zuerst (Buttons, role="button")
-                        const spaElements = [
-                            ...document.querySelectorAll('button:not([type="submit"])'),
-                            ...document.querySelectorAll('[role="button"]'),
-                            ...document.querySelectorAll('[role="tab"]'),
-                            ...document.querySelectorAll('[role="menuitem"]'),
-                            ...document.querySelectorAll('[onclick]'),
-                            ...document.querySelectorAll('[routerlink]'),
-                            ...document.querySelectorAll('[data-route]'),
-                            ...document.querySelectorAll('.router-link'),
-                        ];
-                        
-                        // Dann interne Links (aber mit niedrigerer Priorität)
-                        const linkElements = [
-                            ...document.querySelectorAll('nav a'),
-                            ...document.querySelectorAll('a[href^="#"]'),
-                            ...document.querySelectorAll('a[href^="/"]'),
-                        ];
-                        
-                        const allElements = [...spaElements, ...linkElements];
-                        
-                        return allElements
-                            .filter(el => {
-                                try {
-                                    const rect = el.getBoundingClientRect();
-                                    const style = window.getComputedStyle(el);
-                                    
-                                    // Sichtbarkeits-Check
-                                    if (rect.width <= 0 || rect.height <= 0 || 
-                                        rect.top < 0 || rect.left < 0 ||
-                                        rect.top >= window.innerHeight ||
-                                        style.display === 'none' ||
-                                        style.visibility === 'hidden' ||
-                                        style.opacity === '0') {
-                                        return false;
-                                    }
-                                    
-                                    // Filter Links
-                                    if (el.tagName.toLowerCase() === 'a') {
-                                        const href = el.getAttribute('href');
-                                        
-                                        if (!href) return true;
-                                        
-                                        // Blockiere externe Protokolle
-                                        if (href.startsWith('mailto:') || 
-                                            href.startsWith('tel:') || 
-                                            href.startsWith('file:')) {
-                                            return false;
-                                        }
-                                        
-                                        // Erlaube Hash-Links (sehr SPA-typisch)
-                                        if (href.startsWith('#')) return true;
-                                        
-                                        // Erlaube relative Links
-                                        if (href.startsWith('/') && !href.startsWith('//')) return true;
-                                        
-                                        // Prüfe absolute URLs
-                                        try {
-                                            const url = new URL(href, currentOrigin);
-                                            if (url.hostname !== currentHostname) return false;
-                                        } catch (e) {
-                                            return false;
-                                        }
-                                        
-                                        return true;
-                                    }
-                                    
-                                    return true;
-                                } catch (e) {
-                                    return false;
-                                }
-                            })
-                            .map((el, idx) => {
-                                let selector = el.tagName.toLowerCase();
-                                if (el.id) selector += '#' + el.id;
-                                else if (el.className && typeof el.className === 'string') {
-                                    const classes = el.className.split(' ').filter(c => c && c.length < 30);
-                                    if (classes[0]) selector += '.' + classes[0];
-                                }
-                                
-                                const href = el.getAttribute('href');
-                                const isSpaElement = el.tagName.toLowerCase() !== 'a' ||
-                                                    href?.startsWith('#') ||
-                                                    el.hasAttribute('onclick') ||
-                                                    el.hasAttribute('routerlink');
-                                
-                                return {
-                                    index: idx,
-                                    selector: selector,
-                                    text: (el.textContent || '').trim().substring(0, 50),
-                                    tag: el.tagName.toLowerCase(),
-                                    hasHref: el.hasAttribute('href'),
-                                    href: href || '',
-                                    isSpaElement: isSpaElement,
-                                    priority: isSpaElement ? 2 : 1
-                                };
-                            })
-                            .slice(0, 50);
-                    }
-                """)
-                
-                if not clickables or len(clickables) == 0:
-                    logger.debug(f"Keine klickbaren Elemente gefunden (Versuch {i+1})")
-                    failed_attempts += 1
-                    await asyncio.sleep(0.5)
-                    continue
-                
-                # Bevorzuge SPA-Elemente (80% Wahrscheinlichkeit)
-                spa_elements = [c for c in clickables if c.get('isSpaElement')]
-                other_elements = [c for c in clickables if not c.get('isSpaElement')]
-                
-                if spa_elements and (not other_elements or random.random() < 0.8):
-                    target = random.choice(spa_elements)
-                else:
-                    target = random.choice(other_elements if other_elements else clickables)
-                
-                element_type = "SPA" if target.get('isSpaElement') else "Link"
-                logger.debug(f"Klicke auf [{element_type}]: {target['text'][:30]} ({target['tag']})")
-                
-                # Klick-Versuche
-                try:
-                    await page.click(target['selector'], timeout=3000)
-                    actions_performed += 1
-                    failed_attempts = 0
-                    logger.info(f"✅ Aktion {actions_performed}: {target['text'][:30]}")
-                    
-                except PlaywrightTimeout:
-                    try:
-                        await page.evaluate(f"""
-                            () => {{
-                                const elements = document.querySelectorAll('{target['selector']}');
-                                if (elements[{target['index']}]) {{
-                                    elements[{target['index']}].click();
-                                }}
-                            }}
-                        """)
-                        actions_performed += 1
-                        logger.info(f"✅ Aktion {actions_performed} (JS): {target['text'][:30]}")
-                    except:
-                        failed_attempts += 1
-                        logger.debug(f"❌ Klick fehlgeschlagen: {target['text'][:30]}")
-                
-                await asyncio.sleep(random.uniform(0.5, 1.5))
-                
-            except Exception as e:
-                logger.debug(f"Interaktion {i+1} fehlgeschlagen: {e}")
-                failed_attempts += 1
-                await asyncio.sleep(0.5)
-                continue
+        Wartet auf durch eine Aktion nachgeladene Ressourcen (höchstens max_ms).
         
-        logger.info(f"✅ Random-Walk abgeschlossen: {actions_performed} erfolgreiche Aktionen")
-        return actions_performed
+        'networkidle' ist nach dem Initial-Load längst erreicht und kehrt sofort
+        zurück. Stattdessen: kommt binnen grace_ms kein neuer Resource-Eintrag
+        (before = Anzahl vor der Aktion), ist nichts nachzuladen - sonst warten,
+        bis seit quiet_ms keine Ressource mehr abgeschlossen wurde.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + max_ms / 1000
+        try:
+            while True:
+                count, quiet, _ = await page.evaluate(RESOURCE_STATE_SCRIPT)
+                if count == before:
+                    if (loop.time() - start) * 1000 >= grace_ms:
+                        return
+                elif quiet >= quiet_ms:
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                await asyncio.sleep(min(poll_ms / 1000, remaining))
+        except Exception as e:
+            logger.debug("Warten auf Nachladen abgebrochen: %s", e)
     
     @staticmethod
     async def test_navigation(page: Page, max_links: int = 5) -> int:
@@ -292,31 +168,40 @@ class InteractionStrategy:
                         ...document.querySelectorAll('header a, [class*="header"] a')
                     ];
                     
-                    return [...new Set(navElements)]
-                        .filter(el => {
-                            const rect = el.getBoundingClientRect();
-                            if (rect.width <= 0 || rect.height <= 0) return false;
-                            
-                            const href = el.getAttribute('href');
-                            if (!href) return false;
-                            
-                            if (href.startsWith('mailto:') || 
-                                href.startsWith('tel:') || 
-                                href.startsWith('file:')) {
-                                return false;
-                            }
-                            
-                            if (href.startsWith('#')) return true;
-                            if (href.startsWith('/') && !href.startsWith('//')) return true;
-                            
+                    const isNavLink = (el) => {
+                        const href = el.getAttribute('href');
+                        if (!href) return false;
+                        
+                        if (href.startsWith('mailto:') || 
+                            href.startsWith('tel:') || 
+                            href.startsWith('file:')) {
+                            return false;
+                        }
+                        
+                        if (!href.startsWith('#') &&
+                            !(href.startsWith('/') && !href.startsWith('//'))) {
                             try {
                                 const url = new URL(href, currentOrigin);
-                                return url.hostname === currentHostname;
+                                if (url.hostname !== currentHostname) return false;
                             } catch (e) {
                                 return false;
                             }
-                        })
-                        .slice(0, 10)
+                        }
+                        
+                        // Layout-Abfrage zuletzt - nur für passende Links
+                        const rect = el.getBoundingClientRect();
+                        return rect.width > 0 && rect.height > 0;
+                    };
+                    
+                    // Abbruch nach 10 Treffern statt alle Links zu vermessen
+                    const picked = [];
+                    for (const el of new Set(navElements)) {
+                        if (!isNavLink(el)) continue;
+                        picked.push(el);
+                        if (picked.length >= 10) break;
+                    }
+                    
+                    return picked
                         .map(el => ({
                             text: el.textContent.trim().substring(0, 30),
                             href: el.getAttribute('href')
@@ -347,23 +232,35 @@ class InteractionStrategy:
     async def scroll_page(page: Page):
         """Scrollt die Seite für Lazy-Loading"""
         try:
+            # Ohne scrollbaren Inhalt oder Lazy-Load-Hinweise gibt es nichts nachzuladen
+            if not await page.evaluate(LAZY_LOAD_HINT_SCRIPT):
+                logger.info("📜 Kein Lazy-Loading erkannt - Scrollen übersprungen")
+                return
+            
             logger.info("📜 Scrolle Seite...")
             
-            await page.evaluate("""
+            # Schritte im Frame-Takt statt fester 200ms - Lazy-Loader (IntersectionObserver)
+            # sehen jede Position trotzdem in einem gerenderten Frame
+            resources_before = await page.evaluate("""
                 async () => {
+                    const before = performance.getEntriesByType('resource').length;
                     const scrollStep = window.innerHeight / 2;
-                    const scrollDelay = 200;
+                    const nextFrame = () => new Promise(resolve =>
+                        requestAnimationFrame(() => requestAnimationFrame(resolve)));
                     
                     for (let i = 0; i < 5; i++) {
                         window.scrollBy(0, scrollStep);
-                        await new Promise(resolve => setTimeout(resolve, scrollDelay));
+                        await nextFrame();
                     }
                     
                     window.scrollTo(0, 0);
+                    return before;
                 }
             """)
             
-            await asyncio.sleep(1)
+            # Nur so lange warten, wie nachgeladen wird (statt pauschal 1s)
+            await InteractionStrategy._wait_for_new_resources(page, resources_before)
+            
             logger.info("✅ Scrolling abgeschlossen")
             
         except Exception as e:
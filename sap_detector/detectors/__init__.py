@@ -9,6 +9,7 @@ from .network_activity_detector import NetworkActivityDetector
 from .dom_rewriting_detector import DOMRewritingDetector
 from .title_change_detector import TitleChangeDetector
 from .clickable_element_detector import ClickableElementDetector
+from .init_script import SPA_INIT_SCRIPT, register_init_script
 
 __all__ = [
     'DetectionResult',
@@ -17,4 +18,6 @@ __all__ = [
     'DOMRewritingDetector',
     'TitleChangeDetector',
     'ClickableElementDetector',
+    'SPA_INIT_SCRIPT',
+    'register_init_script',
 ]
@@ -17,28 +17,56 @@ class ClickableElementDetector:
             data = await page.evaluate("""
                 () => {
                     try {
-                        const realLinks = document.querySelectorAll(
-                            'a[href]:not([href^="#"]):not([href^="javascript:"]):not([href=""])'
-                        );
-                        const realLinkCount = realLinks.length;
+                        // Ein Durchlauf über alle Elemente statt einer querySelectorAll-
+                        // Traversierung je Muster. Die Prädikate entsprechen den Selektoren
+                        // in den Kommentaren (Klassen im Quirks-Mode ohne Groß/Klein)
+                        const quirks = document.compatMode === 'BackCompat';
+                        const CURSOR_CLASSES = new Set(['clickable', 'pointer', 'click']);
+                        const classTokens = (cls) => (quirks ? cls.toLowerCase() : cls).split(/[ \\t\\n\\f\\r]+/);
                         
-                        const clickables = document.querySelectorAll(
-                            'div[onclick], span[onclick], button:not([type="submit"]), ' +
-                            '[role="button"], [role="link"]'
-                        );
-                        const fakeClickableCount = clickables.length;
+                        let realLinkCount = 0;
+                        let fakeClickableCount = 0;
+                        let cursorPointerCount = 0;
+                        let routerLinkCount = 0;
+                        let total = 0;
                         
-                        const withCursor = document.querySelectorAll(
-                            '[style*="cursor: pointer"], [style*="cursor:pointer"], ' +
-                            '.clickable, .pointer, .click'
-                        );
-                        const cursorPointerCount = withCursor.length;
-                        
-                        const routerLinks = document.querySelectorAll(
-                            '[routerlink], [to], [data-route], [href^="/"], ' +
-                            '.router-link, .nav-link, [class*="link"]'
-                        );
-                        const routerLinkCount = routerLinks.length;
+                        for (const el of document.getElementsByTagName('*')) {
+                            total++;
+                            const tag = el.localName;
+                            const href = el.getAttribute('href');
+                            const cls = el.getAttribute('class');
+                            
+                            // a[href]:not([href^="#"]):not([href^="javascript:"]):not([href=""])
+                            if (tag === 'a' && href && href[0] !== '#' && !href.startsWith('javascript:')) {
+                                realLinkCount++;
+                            }
+                            
+                            // div[onclick], span[onclick], button:not([type="submit"]),
+                            // [role="button"], [role="link"]
+                            const role = el.getAttribute('role');
+                            if (((tag === 'div' || tag === 'span') && el.hasAttribute('onclick')) ||
+                                (tag === 'button' && (el.getAttribute('type') || '').toLowerCase() !== 'submit') ||
+                                role === 'button' || role === 'link') {
+                                fakeClickableCount++;
+                            }
+                            
+                            // [style*="cursor: pointer"], [style*="cursor:pointer"], .clickable, .pointer, .click
+                            const style = el.getAttribute('style');
+                            if ((style && (style.includes('cursor: pointer') || style.includes('cursor:pointer'))) ||
+                                (cls && /click|pointer/i.test(cls) &&
+                                 classTokens(cls).some(t => CURSOR_CLASSES.has(t)))) {
+                                cursorPointerCount++;
+                            }
+                            
+                            // [routerlink], [to], [data-route], [href^="/"],
+                            // .router-link, .nav-link, [class*="link"]
+                            if (el.hasAttribute('routerlink') || el.hasAttribute('to') ||
+                                el.hasAttribute('data-route') || (href && href[0] === '/') ||
+                                (cls && (cls.includes('link') ||
+                                         (quirks && classTokens(cls).some(t => t === 'router-link' || t === 'nav-link'))))) {
+                                routerLinkCount++;
+                            }
+                        }
                         
                         const hasReact = !!document.querySelector('[data-reactroot], [data-react-app]');
                         const hasVue = !!document.querySelector('[data-v-], #app.__vue__');
@@ -49,7 +77,7 @@ class ClickableElementDetector:
                             fakeClickables: fakeClickableCount,
                             cursorPointers: cursorPointerCount,
                             routerLinks: routerLinkCount,
-                            total: document.querySelectorAll('*').length,
+                            total,
                             hasReact,
                             hasVue,
                             hasAngular
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 from typing import Dict, Any, Optional
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DetectionResult:
     """Ergebnis eines einzelnen Detektors"""
     signal_name: str
@@ -8,17 +8,25 @@ Signal 3: Signifikantes DOM-Rewriting
 - Filterung von Consent/Ads/Overlay Mutations
 """
 import logging
-from typing import Optional, Dict, List
+from bisect import bisect_right
+from typing import Optional, Dict, List, Tuple
 from .detection_result import DetectionResult
 
 logger = logging.getLogger(__name__)
 
+# Post-Click Schwellwerte: (min. Mutations, min. Node-Changes, Confidence, Label) - absteigend
+_POSTCLICK_THRESHOLDS = (
+    (30, 50, 0.85, "high"),
+    (15, 30, 0.70, "moderate"),
+    (5, 10, 0.50, "some"),
+)
+
 
 # JavaScript Code mit Baseline/Post-Click Trennung
 DOM_OBSERVER_SCRIPT = """
 (() => {
-    if (window.__spa_detection_dom_injecting) return;
-    window.__spa_detection_dom_injecting = true;
+    // Idempotent: pro Dokument genau ein Observer (InitScript und direkte Injection teilen das Flag)
+    if (window.__spa_detection_dom_injected) return;
     window.__spa_detection_dom_injected = true;
 
     window.__spa_detection = window.__spa_detection || {};
@@ -36,38 +44,48 @@ DOM_OBSERVER_SCRIPT = """
         'sticky', 'fixed-', 'toast', 'notification',
         'recaptcha', 'captcha'
     ];
+    // Einmal kompiliert: ein Regex-Test statt Schleife über alle Patterns
+    const IGNORED_RE = new RegExp(IGNORED_PATTERNS.join('|'));
+    // head/title: Script-/Meta-Einfügungen und Titelwechsel sind kein Content-Rewrite
+    // (Titel zählt der Title-Detektor)
+    const IGNORED_TAGS = new Set(['script', 'style', 'iframe', 'noscript', 'link', 'head', 'title']);
     
-    const shouldIgnoreMutation = (target) => {
-        if (!target || !target.nodeType) return true;
-        if (target.nodeType !== 1) return false; // Nur Element-Nodes prüfen
-        
-        const tagName = (target.tagName || '').toLowerCase();
-        
-        // Ignoriere script, style, iframe
-        if (['script', 'style', 'iframe', 'noscript', 'link'].includes(tagName)) {
+    // Obergrenze pro Observer-Callback (schützt den Main-Thread bei Mutation-Stürmen)
+    const MAX_MUTATIONS_PER_BATCH = 500;
+    
+    // Ab dieser Gesamtzahl nur noch Zähler aktualisieren (keine Detail-Objekte mehr)
+    const SUMMARY_MODE_THRESHOLD = 2000;
+    
+    // Große Mutations als Structure-of-Arrays (keine Objekt-Allokation pro Mutation)
+    const LARGE_MUTATION_CAPACITY = 30;
+    
+    // Click-Window-Historie als Ringpuffer (konstanter Speicher bei langen Sessions)
+    const MAX_WINDOW_HISTORY = 20;
+    
+    const matchesIgnoredPattern = (el) => {
+        // SVG: className ist ein SVGAnimatedString - Attribut direkt als String lesen
+        const cls = typeof el.className === 'string'
+            ? el.className
+            : (el.getAttribute ? el.getAttribute('class') || '' : '');
+        return IGNORED_RE.test(((el.id || '') + ' ' + cls).toLowerCase());
+    };
+    
+    const isIgnoredElement = (target) => {
+        // Ignoriere script, style, iframe, head
+        if (IGNORED_TAGS.has((target.tagName || '').toLowerCase())) {
             return true;
         }
         
         // Prüfe ID und Klassen
-        const id = (target.id || '').toLowerCase();
-        const className = (target.className || '').toString().toLowerCase();
-        
-        for (const pattern of IGNORED_PATTERNS) {
-            if (id.includes(pattern) || className.includes(pattern)) {
-                return true;
-            }
+        if (matchesIgnoredPattern(target)) {
+            return true;
         }
         
         // Prüfe auch Parent-Elemente (bis zu 3 Level hoch)
         let parent = target.parentElement;
         for (let i = 0; i < 3 && parent; i++) {
-            const parentId = (parent.id || '').toLowerCase();
-            const parentClass = (parent.className || '').toString().toLowerCase();
-            
-            for (const pattern of IGNORED_PATTERNS) {
-                if (parentId.includes(pattern) || parentClass.includes(pattern)) {
-                    return true;
-                }
+            if (matchesIgnoredPattern(parent)) {
+                return true;
             }
             parent = parent.parentElement;
         }
@@ -75,6 +93,21 @@ DOM_OBSERVER_SCRIPT = """
         return false;
     };
     
+    // Entscheidung pro Element cachen (WeakMap hält entfernte Nodes nicht am Leben)
+    const ignoreCache = new WeakMap();
+    
+    const shouldIgnoreMutation = (target) => {
+        if (!target || !target.nodeType) return true;
+        if (target.nodeType !== 1) return false; // Nur Element-Nodes prüfen
+        
+        let ignored = ignoreCache.get(target);
+        if (ignored === undefined) {
+            ignored = isIgnoredElement(target);
+            ignoreCache.set(target, ignored);
+        }
+        return ignored;
+    };
+    
     const existingDom = window.__spa_detection.dom || {};
     const injectionCount = (existingDom.injectionCount || 0) + 1;
     
@@ -89,126 +122,218 @@ DOM_OBSERVER_SCRIPT = """
         
         // POST-CLICK: Mutations nach Interaktionen
         postClick: {
-            mutationCount: existingDom.postClick?.mutationCount || 0,
-            nodesAdded: existingDom.postClick?.nodesAdded || 0,
-            nodesRemoved: existingDom.postClick?.nodesRemoved || 0,
-            windows: existingDom.postClick?.windows || []  // Jedes Click-Window separat
+            windows: existingDom.postClick?.windows || [],  // Letzte MAX_WINDOW_HISTORY Click-Windows
+            windowCount: existingDom.postClick?.windowCount || 0  // Echte Anzahl (unbegrenzt)
         },
         
         // Aktuelles Fenster
         currentWindow: null,
         windowStartTime: null,
         
+        // Click-Zähler [mutations, added, removed]: 0-2 aktuelles Fenster, 3-5 Post-Click gesamt
+        clickCounters: existingDom.clickCounters || new Int32Array(6),
+        
         // Gesamtzahlen (für Kompatibilität)
         mutationCount: existingDom.mutationCount || 0,
         nodesAdded: existingDom.nodesAdded || 0,
         nodesRemoved: existingDom.nodesRemoved || 0,
-        largeMutations: existingDom.largeMutations || [],
+        largeCount: existingDom.largeCount || 0,
+        largeAdded: existingDom.largeAdded || new Int32Array(LARGE_MUTATION_CAPACITY),
+        largeRemoved: existingDom.largeRemoved || new Int32Array(LARGE_MUTATION_CAPACITY),
+        largeTs: existingDom.largeTs || new Float64Array(LARGE_MUTATION_CAPACITY),
+        largeTarget: existingDom.largeTarget || new Array(LARGE_MUTATION_CAPACITY),
+        largeTargetId: existingDom.largeTargetId || new Array(LARGE_MUTATION_CAPACITY),
+        largeTargetClass: existingDom.largeTargetClass || new Array(LARGE_MUTATION_CAPACITY),
+        largeBaseline: existingDom.largeBaseline || new Uint8Array(LARGE_MUTATION_CAPACITY),
+        droppedMutations: existingDom.droppedMutations || 0,
+        summaryMode: existingDom.summaryMode || false,
         
         // Meta
         observerActive: false,
         injectionCount: injectionCount,
         baselineEndTime: null,
-        initial: existingDom.initial || { length: 0, tagCount: 0 }
+        initial: existingDom.initial || { tagCount: 0 }
     };
 
     // Baseline endet nach 3 Sekunden
     const BASELINE_DURATION_MS = 3000;
-    const baselineStartTime = performance.now();
+    let baselineStartTime = performance.now();
     
-    setTimeout(() => {
-        if (window.__spa_detection && window.__spa_detection.dom) {
-            window.__spa_detection.dom.baseline.phase = 'done';
-            window.__spa_detection.dom.baselineEndTime = performance.now();
-            console.log('[SPA-Detection] Baseline abgeschlossen:', window.__spa_detection.dom.baseline);
+    // Phasenwechsel inline bei Aktivität prüfen statt per setTimeout
+    // (Timer-Macrotasks können auf ausgelasteten Seiten stark verspätet feuern)
+    const endBaselineIfDue = (t) => {
+        const d = window.__spa_detection.dom;
+        if (d.baseline.phase !== 'collecting' || (t - baselineStartTime) < BASELINE_DURATION_MS) return;
+        
+        // Noch ausstehende Records gehören zur Baseline
+        flushMutations();
+        d.baseline.phase = 'done';
+        d.baselineEndTime = t;
+        console.log('[SPA-Detection] Baseline abgeschlossen:', d.baseline);
+        
+        if (!d.currentWindow) pauseObserver();
+    };
+
+    // Mutation-Records sammeln und einmal pro Animation-Frame verarbeiten
+    const pendingBatches = [];
+    let flushScheduled = false;
+    
+    const flushMutations = () => {
+        flushScheduled = false;
+        if (pendingBatches.length === 0) return;
+        const batches = pendingBatches.splice(0, pendingBatches.length);
+        
+        try {
+            const t = performance.now();
+            const d = window.__spa_detection.dom;
+            const root = document.documentElement;
+            
+            if (!d.summaryMode && d.mutationCount > SUMMARY_MODE_THRESHOLD) {
+                d.summaryMode = true;
+            }
+            
+            // Phase und Sample-Erfassung einmal pro Flush bestimmen, nicht pro Record
+            const inBaseline = d.baseline.phase === 'collecting' ? 1 : 0;
+            const recordLarge = !d.summaryMode;
+            
+            let validMutations = 0;
+            let addedNodes = 0;
+            let removedNodes = 0;
+            
+            for (let b = 0; b < batches.length; b++) {
+                const mutations = batches[b];
+                
+                // Pro Batch maximal MAX_MUTATIONS_PER_BATCH verarbeiten, Rest nur zählen
+                const limit = Math.min(mutations.length, MAX_MUTATIONS_PER_BATCH);
+                if (mutations.length > MAX_MUTATIONS_PER_BATCH) {
+                    d.droppedMutations += mutations.length - MAX_MUTATIONS_PER_BATCH;
+                }
+                
+                for (let i = 0; i < limit; i++) {
+                    const mutation = mutations[i];
+                    
+                    // <head>/<body>-Austausch direkt unter <html> ist kein Content-Rewrite
+                    if (mutation.target === root) {
+                        continue;
+                    }
+                    
+                    // FILTERUNG: Ignoriere Consent/Ads/etc.
+                    if (shouldIgnoreMutation(mutation.target)) {
+                        continue;
+                    }
+                    
+                    const added = mutation.addedNodes ? mutation.addedNodes.length : 0;
+                    const removed = mutation.removedNodes ? mutation.removedNodes.length : 0;
+                    
+                    validMutations++;
+                    addedNodes += added;
+                    removedNodes += removed;
+                    
+                    // Große Mutations für Evidence speichern
+                    const total = added + removed;
+                    if (recordLarge && total >= 5 && d.largeCount < LARGE_MUTATION_CAPACITY) {
+                        const k = d.largeCount++;
+                        d.largeAdded[k] = added;
+                        d.largeRemoved[k] = removed;
+                        d.largeTs[k] = t;
+                        d.largeTarget[k] = mutation.target?.nodeName || 'UNKNOWN';
+                        d.largeTargetId[k] = mutation.target?.id || null;
+                        // Roh speichern - Kürzen passiert erst in Python (collect_data)
+                        d.largeTargetClass[k] = mutation.target?.getAttribute?.('class') || null;
+                        d.largeBaseline[k] = inBaseline;
+                    }
+                }
+            }
+            
+            if (validMutations === 0) return;
+            
+            // Gesamtzahlen aktualisieren (einmal pro Frame)
+            d.mutationCount += validMutations;
+            d.nodesAdded += addedNodes;
+            d.nodesRemoved += removedNodes;
+            
+            // In richtige Kategorie einsortieren
+            if (inBaseline) {
+                // BASELINE Phase
+                d.baseline.mutationCount += validMutations;
+                d.baseline.nodesAdded += addedNodes;
+                d.baseline.nodesRemoved += removedNodes;
+            } else if (d.currentWindow) {
+                // POST-CLICK Phase (aktives Fenster + Gesamt-PostClick)
+                const c = d.clickCounters;
+                c[0] += validMutations; c[3] += validMutations;
+                c[1] += addedNodes;     c[4] += addedNodes;
+                c[2] += removedNodes;   c[5] += removedNodes;
+            }
+            
+        } catch (e) {
+            console.error('[SPA-Detection] Mutation error:', e);
         }
-    }, BASELINE_DURATION_MS);
+    };
+    
+    // Vor Phasen-/Fensterwechseln und beim Einsammeln ausstehende Records verarbeiten
+    window.__spa_detection.flushDomMutations = flushMutations;
+    
+    const scheduleFlush = typeof requestAnimationFrame === 'function'
+        ? () => requestAnimationFrame(flushMutations)
+        : () => setTimeout(flushMutations, 16);
+
+    // Zwischen Click-Windows abgekoppelt: der Browser erzeugt dann gar keine Records
+    const OBSERVE_OPTIONS = { childList: true, subtree: true };
+    let observer = null;
+    let observing = false;
+    
+    const pauseObserver = () => {
+        if (!observer || !observing) return;
+        const records = observer.takeRecords();
+        if (records.length) pendingBatches.push(records);
+        flushMutations();
+        observer.disconnect();
+        observing = false;
+    };
+    
+    const resumeObserver = () => {
+        if (!observer || observing || !document.documentElement) return;
+        observer.observe(document.documentElement, OBSERVE_OPTIONS);
+        observing = true;
+    };
 
     const startObserver = () => {
         const dom = window.__spa_detection.dom;
-        const targetNode = document.body || document.documentElement;
+        // documentElement statt body: überlebt Body-Swaps (SSR→CSR Hydration)
+        const targetNode = document.documentElement;
         
         if (!targetNode || dom.observerActive) return;
         
         if (dom.initial.tagCount === 0) {
             try {
                 dom.initial = {
-                    length: (document.documentElement.outerHTML || '').length,
                     tagCount: document.getElementsByTagName('*').length
                 };
             } catch (e) {}
         }
         
         try {
-            const observer = new MutationObserver((mutations) => {
-                try {
-                    const t = performance.now();
-                    const d = window.__spa_detection.dom;
-                    
-                    let validMutations = 0;
-                    let addedNodes = 0;
-                    let removedNodes = 0;
-                    
-                    mutations.forEach(mutation => {
-                        // FILTERUNG: Ignoriere Consent/Ads/etc.
-                        if (shouldIgnoreMutation(mutation.target)) {
-                            return;
-                        }
-                        
-                        const added = mutation.addedNodes ? mutation.addedNodes.length : 0;
-                        const removed = mutation.removedNodes ? mutation.removedNodes.length : 0;
-                        
-                        validMutations++;
-                        addedNodes += added;
-                        removedNodes += removed;
-                        
-                        // Große Mutations für Evidence speichern
-                        const total = added + removed;
-                        if (total >= 5 && d.largeMutations.length < 30) {
-                            d.largeMutations.push({
-                                added, removed,
-                                timestamp_perf: t,
-                                target: mutation.target?.nodeName || 'UNKNOWN',
-                                targetId: mutation.target?.id || null,
-                                phase: d.baseline.phase === 'collecting' ? 'baseline' : 'post-click'
-                            });
-                        }
-                    });
-                    
-                    if (validMutations === 0) return;
-                    
-                    // Gesamtzahlen aktualisieren
-                    d.mutationCount += validMutations;
-                    d.nodesAdded += addedNodes;
-                    d.nodesRemoved += removedNodes;
-                    
-                    // In richtige Kategorie einsortieren
-                    if (d.baseline.phase === 'collecting') {
-                        // BASELINE Phase
-                        d.baseline.mutationCount += validMutations;
-                        d.baseline.nodesAdded += addedNodes;
-                        d.baseline.nodesRemoved += removedNodes;
-                    } else if (d.currentWindow) {
-                        // POST-CLICK Phase (aktives Fenster)
-                        d.currentWindow.mutationCount += validMutations;
-                        d.currentWindow.nodesAdded += addedNodes;
-                        d.currentWindow.nodesRemoved += removedNodes;
-                        
-                        // Auch in Gesamt-PostClick
-                        d.postClick.mutationCount += validMutations;
-                        d.postClick.nodesAdded += addedNodes;
-                        d.postClick.nodesRemoved += removedNodes;
-                    }
-                    
-                } catch (e) {
-                    console.error('[SPA-Detection] Mutation error:', e);
+            observer = new MutationObserver((mutations) => {
+                endBaselineIfDue(performance.now());
+                
+                // Leerlauf zwischen Klicks (Baseline fertig, kein Fenster offen): nicht
+                // zählen - wie bei pausiertem Observer gehen in alle Zähler nur gefilterte
+                // Mutations aus Baseline und Click-Windows ein
+                const d = window.__spa_detection.dom;
+                if (d.baseline.phase === 'done' && !d.currentWindow) {
+                    return;
+                }
+                
+                pendingBatches.push(mutations);
+                if (!flushScheduled) {
+                    flushScheduled = true;
+                    scheduleFlush();
                 }
             });
 
-            observer.observe(targetNode, {
-                childList: true,
-                subtree: true
-            });
+            observer.observe(targetNode, OBSERVE_OPTIONS);
+            observing = true;
             
             dom.observerActive = true;
             console.log('[SPA-Detection] DOM Observer aktiv (v4 - Baseline/PostClick)');
@@ -218,43 +343,88 @@ DOM_OBSERVER_SCRIPT = """
         }
     };
 
+    // Offenes Fenster abschließen: Zähler aus dem Int32Array in die Historie übernehmen
+    const closeCurrentWindow = (dom, t) => {
+        const w = dom.currentWindow;
+        if (!w) return null;
+        const c = dom.clickCounters;
+        w.endTime = t;
+        w.duration = t - w.startTime;
+        w.mutationCount = c[0];
+        w.nodesAdded = c[1];
+        w.nodesRemoved = c[2];
+        const windows = dom.postClick.windows;
+        if (windows.length >= MAX_WINDOW_HISTORY) windows.shift();
+        windows.push(w);
+        dom.postClick.windowCount++;
+        dom.currentWindow = null;
+        return w;
+    };
+    window.__spa_detection.closeDomClickWindow = (t) => closeCurrentWindow(window.__spa_detection.dom, t);
+
     // Methode um Click-Window zu starten (wird vom Analyzer aufgerufen)
     window.__spa_detection.startClickWindow = (label) => {
+        flushMutations();
         const dom = window.__spa_detection.dom;
         const t = performance.now();
+        endBaselineIfDue(t);
         
         // Schließe vorheriges Fenster
-        if (dom.currentWindow) {
-            dom.currentWindow.endTime = t;
-            dom.currentWindow.duration = t - dom.currentWindow.startTime;
-            dom.postClick.windows.push(dom.currentWindow);
-        }
+        closeCurrentWindow(dom, t);
         
         // Neues Fenster öffnen
+        dom.clickCounters.fill(0, 0, 3);
         dom.currentWindow = {
             label: label || 'click',
-            startTime: t,
-            mutationCount: 0,
-            nodesAdded: 0,
-            nodesRemoved: 0
+            startTime: t
         };
+        resumeObserver();
         
         console.log('[SPA-Detection] Click-Window gestartet:', label);
     };
     
     // Methode um Click-Window zu beenden
     window.__spa_detection.endClickWindow = () => {
+        flushMutations();
         const dom = window.__spa_detection.dom;
         const t = performance.now();
         
-        if (dom.currentWindow) {
-            dom.currentWindow.endTime = t;
-            dom.currentWindow.duration = t - dom.currentWindow.startTime;
-            dom.postClick.windows.push(dom.currentWindow);
-            
-            console.log('[SPA-Detection] Click-Window beendet:', dom.currentWindow);
-            dom.currentWindow = null;
+        const closed = closeCurrentWindow(dom, t);
+        if (closed) {
+            console.log('[SPA-Detection] Click-Window beendet:', closed);
         }
+        
+        if (dom.baseline.phase === 'done') pauseObserver();
+    };
+
+    // Beim Detektor-Setup (Seite geladen) Zähler und Baseline neu starten: als InitScript
+    // läuft der Observer ab document_start, Lade-Mutationen sind aber keine Baseline
+    window.__spa_detection.resetDomBaseline = () => {
+        if (observer) observer.takeRecords();
+        pendingBatches.length = 0;
+        const d = window.__spa_detection.dom;
+        const t = performance.now();
+        d.baseline.mutationCount = 0;
+        d.baseline.nodesAdded = 0;
+        d.baseline.nodesRemoved = 0;
+        d.baseline.phase = 'collecting';
+        d.baselineEndTime = null;
+        d.mutationCount = 0;
+        d.nodesAdded = 0;
+        d.nodesRemoved = 0;
+        d.largeCount = 0;
+        d.droppedMutations = 0;
+        d.summaryMode = false;
+        d.clickCounters.fill(0);
+        d.currentWindow = null;
+        d.postClick.windows = [];
+        d.postClick.windowCount = 0;
+        try {
+            d.initial = { tagCount: document.getElementsByTagName('*').length };
+        } catch (e) {}
+        window.__spa_detection.t0 = t;
+        baselineStartTime = t;
+        if (d.observerActive) resumeObserver();
     };
 
     // Starte Observer
@@ -266,15 +436,105 @@ DOM_OBSERVER_SCRIPT = """
     window.addEventListener('load', () => {
         if (!window.__spa_detection.dom.observerActive) startObserver();
     });
-    
-    setTimeout(() => { window.__spa_detection_dom_injecting = false; }, 100);
 })();
 """
 
+# Ein Round-Trip: Skript ist idempotent, Baseline ab jetzt, danach Status melden
+DOM_OBSERVER_BOOTSTRAP = ("() => {" + DOM_OBSERVER_SCRIPT +
+                          " window.__spa_detection.resetDomBaseline?.();"
+                          " return !!window.__spa_detection_dom_injected; }")
+
+# Einsammeln: offenes Fenster schließen, kompakten Payload für analyze() liefern
+DOM_COLLECT_SCRIPT = """
+() => {
+    const dom = (window.__spa_detection && window.__spa_detection.dom) || null;
+    const t0 = (window.__spa_detection && window.__spa_detection.t0) || null;
+    const currentTime = performance.now();
+
+    if (!dom) {
+        return {
+            dom: {
+                mutationCount: 0, nodesAdded: 0, nodesRemoved: 0,
+                baseline: { mutationCount: 0, nodesAdded: 0, nodesRemoved: 0, phase: 'done' },
+                postClick: { mutationCount: 0, nodesAdded: 0, nodesRemoved: 0, windowCount: 0 },
+                large: { added: [], removed: [], ts: [], target: [], targetId: [], targetClass: [], baseline: [] },
+                droppedMutations: 0,
+                summaryMode: false,
+                observerActive: false,
+                initial: { tagCount: 0 }
+            },
+            t0: currentTime,
+            currentTime: currentTime,
+            finalMetrics: {
+                tagCount: document.getElementsByTagName('*').length
+            }
+        };
+    }
+
+    // Ausstehende (noch nicht per Frame verarbeitete) Records einrechnen
+    if (window.__spa_detection.flushDomMutations) {
+        window.__spa_detection.flushDomMutations();
+    }
+
+    // Schließe aktuelles Window falls offen
+    if (dom.currentWindow) {
+        window.__spa_detection.closeDomClickWindow(currentTime);
+    }
+
+    // Kompakter Payload: nur was analyze() liest.
+    // Alle Timestamps (Early/Late), aber nur 5 Sample-Records.
+    const n = Math.min(dom.largeCount || 0, dom.largeTs.length);
+    const s = Math.min(n, 5);
+    const large = {
+        ts: Array.from(dom.largeTs.subarray(0, n)),
+        added: Array.from(dom.largeAdded.subarray(0, s)),
+        removed: Array.from(dom.largeRemoved.subarray(0, s)),
+        target: dom.largeTarget.slice(0, s),
+        targetId: dom.largeTargetId.slice(0, s),
+        targetClass: dom.largeTargetClass.slice(0, s),
+        baseline: Array.from(dom.largeBaseline.subarray(0, s))
+    };
+
+    return { 
+        dom: {
+            mutationCount: dom.mutationCount,
+            nodesAdded: dom.nodesAdded,
+            nodesRemoved: dom.nodesRemoved,
+            baseline: {
+                mutationCount: dom.baseline.mutationCount,
+                nodesAdded: dom.baseline.nodesAdded,
+                nodesRemoved: dom.baseline.nodesRemoved
+            },
+            // Fenster-Details bleiben im Browser, analyze() braucht nur die Anzahl
+            postClick: {
+                mutationCount: dom.clickCounters[3],
+                nodesAdded: dom.clickCounters[4],
+                nodesRemoved: dom.clickCounters[5],
+                windowCount: dom.postClick.windowCount
+            },
+            large,
+            droppedMutations: dom.droppedMutations,
+            summaryMode: dom.summaryMode,
+            observerActive: dom.observerActive,
+            initial: dom.initial
+        }, 
+        t0, 
+        currentTime,
+        finalMetrics: {
+            // Echte Zählung: Observer-Zähler erfassen nur Top-Level-Nodes (inkl. Text)
+            // und ruhen bei pausiertem Observer - einmal pro Analyse
+            tagCount: document.getElementsByTagName('*').length
+        }
+    };
+}
+"""
+
 
 class DOMRewritingDetector:
     """Signal 3: Signifikantes DOM-Rewriting (v4 - Baseline/Post-Click)"""
     
+    COLLECT_SCRIPT = DOM_COLLECT_SCRIPT
+    
     def __init__(self, early_ms: int = 2000):
         self.mutation_count = 0
         self.nodes_added = 0
@@ -285,47 +545,67 @@ class DOMRewritingDetector:
         self.baseline_nodes = 0
         self.postclick_mutations = 0
         self.postclick_nodes = 0
-        self.click_windows = []
+        self.click_window_count = 0
         
-        self.container_mutations = []
-        self._init_script_added = False
+        # Große Mutations: nur Anzahl + max. 5 Samples (mehr liest analyze() nicht)
+        self.container_mutations_count = 0
+        self.container_mutations_sample: List[Dict] = []
+        self.dropped_mutations = 0
+        self.summary_mode = False
         
         self.early_ms = early_ms
         self._t0 = None
+        self._large_mutation_ts: List[float] = []
         self._observation_duration_ms = 0
         
-        self._server_html: Optional[str] = None
-        self._server_metrics: Optional[Dict[str, int]] = None
         self._initial_dom_metrics: Optional[Dict[str, int]] = None
         self._final_dom_metrics: Optional[Dict[str, int]] = None
     
-    def record_server_html(self, html: str):
-        self._server_html = html
-        self._server_metrics = self._basic_dom_metrics(html)
-    
-    def _basic_dom_metrics(self, html: str) -> Dict[str, int]:
-        try:
-            import re
-            tags = re.findall(r"<([a-zA-Z0-9-]+)(\s|>)", html or "")
-            return {"length": len(html or ""), "tag_count": len(tags)}
-        except Exception:
-            return {"length": 0, "tag_count": 0}
+    @staticmethod
+    def _assemble_large_mutations(large: Dict[str, List]) -> List[Dict]:
+        """Setzt die SoA-Puffer aus dem Browser wieder zu Mutation-Records zusammen"""
+        added = large.get('added') or []
+        removed = large.get('removed') or []
+        ts = large.get('ts') or []
+        target = large.get('target') or []
+        target_id = large.get('targetId') or []
+        target_class = large.get('targetClass') or []
+        baseline = large.get('baseline') or []
+        
+        # ts enthält alle Timestamps, die übrigen Felder nur die (max. 5) Samples;
+        # die Länge der Sample-Felder begrenzt die Records, kein Nach-Slicen nötig
+        return [
+            {
+                'added': added[k],
+                'removed': removed[k],
+                'timestamp_perf': ts[k],
+                'target': target[k] if k < len(target) else 'UNKNOWN',
+                'targetId': target_id[k] if k < len(target_id) else None,
+                'targetClass': str(target_class[k])[:50] if k < len(target_class) and target_class[k] else '',
+                'phase': 'baseline' if k < len(baseline) and baseline[k] else 'post-click'
+            }
+            for k in range(min(len(added), len(removed), len(ts)))
+        ]
     
     async def inject_observer(self, page):
         """Injiziert MutationObserver mit Baseline/Post-Click Tracking"""
         try:
-            if not self._init_script_added:
-                await page.context.add_init_script(DOM_OBSERVER_SCRIPT)
-                self._init_script_added = True
+            # Lazy: init_script importiert die Detektor-Skripte
+            from .init_script import ensure_init_script
+            if await ensure_init_script(page.context, 'dom', DOM_OBSERVER_SCRIPT):
                 logger.info("DOM-Observer als InitScript registriert (v4)")
             
+            # InitScript greift erst ab der nächsten Navigation - aktuelle Seite direkt versorgen
+            injected = False
             try:
-                await page.evaluate(DOM_OBSERVER_SCRIPT)
+                injected = await page.evaluate(DOM_OBSERVER_BOOTSTRAP)
             except Exception as e:
                 logger.debug(f"Direkte DOM-Injection: {e}")
             
-            await page.wait_for_timeout(200)
-            logger.info("DOM-Observer injiziert (Baseline/Post-Click Tracking)")
+            if injected:
+                logger.info("DOM-Observer injiziert (Baseline/Post-Click Tracking)")
+            else:
+                logger.warning("⚠️  DOM-Observer nicht bestätigt")
             
         except Exception as e:
             logger.error(f"Fehler beim Injizieren des DOM-Observers: {e}")
@@ -333,92 +613,56 @@ class DOMRewritingDetector:
     async def start_click_window(self, page, label: str = "click"):
         """Startet ein neues Click-Measurement-Window"""
         try:
-            await page.evaluate(f"window.__spa_detection?.startClickWindow('{label}')")
+            # Label als Argument: gleicher Funktionstext bei jedem Klick, kein Quoting-Problem
+            await page.evaluate("(label) => window.__spa_detection?.startClickWindow(label)", label)
         except Exception as e:
-            logger.debug(f"Click-Window Start fehlgeschlagen: {e}")
+            logger.debug("Click-Window Start fehlgeschlagen: %s", e)
     
     async def end_click_window(self, page):
         """Beendet das aktuelle Click-Measurement-Window"""
         try:
-            await page.evaluate("window.__spa_detection?.endClickWindow()")
+            await page.evaluate("() => window.__spa_detection?.endClickWindow()")
         except Exception as e:
-            logger.debug(f"Click-Window End fehlgeschlagen: {e}")
+            logger.debug("Click-Window End fehlgeschlagen: %s", e)
     
-    async def collect_data(self, page):
-        """Sammelt Mutations-Daten mit Baseline/Post-Click Trennung"""
+    async def collect_data(self, page, data: Optional[Dict] = None):
+        """Sammelt Mutations-Daten mit Baseline/Post-Click Trennung (data: bereits geholtes COLLECT_SCRIPT-Ergebnis)"""
         try:
-            data = await page.evaluate("""
-                () => {
-                    const dom = (window.__spa_detection && window.__spa_detection.dom) || null;
-                    const t0 = (window.__spa_detection && window.__spa_detection.t0) || null;
-                    const currentTime = performance.now();
-                    
-                    if (!dom) {
-                        return {
-                            dom: {
-                                mutationCount: 0, nodesAdded: 0, nodesRemoved: 0,
-                                baseline: { mutationCount: 0, nodesAdded: 0, nodesRemoved: 0, phase: 'done' },
-                                postClick: { mutationCount: 0, nodesAdded: 0, nodesRemoved: 0, windows: [] },
-                                largeMutations: [],
-                                observerActive: false,
-                                initial: { length: 0, tagCount: 0 }
-                            },
-                            t0: currentTime,
-                            currentTime: currentTime,
-                            finalMetrics: {
-                                length: (document.documentElement.outerHTML || '').length,
-                                tagCount: document.getElementsByTagName('*').length
-                            }
-                        };
-                    }
-                    
-                    // Schließe aktuelles Window falls offen
-                    if (dom.currentWindow) {
-                        dom.currentWindow.endTime = currentTime;
-                        dom.currentWindow.duration = currentTime - dom.currentWindow.startTime;
-                        dom.postClick.windows.push(dom.currentWindow);
-                        dom.currentWindow = null;
-                    }
-                    
-                    return { 
-                        dom, 
-                        t0, 
-                        currentTime,
-                        finalMetrics: {
-                            length: (document.documentElement.outerHTML || '').length,
-                            tagCount: document.getElementsByTagName('*').length
-                        }
-                    };
-                }
-            """)
+            if data is None:
+                data = await page.evaluate(self.COLLECT_SCRIPT)
             
             dom = data.get('dom') or {}
             baseline = dom.get('baseline') or {}
             postclick = dom.get('postClick') or {}
             
             # Gesamt
-            self.mutation_count = int(dom.get('mutationCount', 0) or 0)
-            self.nodes_added = int(dom.get('nodesAdded', 0) or 0)
-            self.nodes_removed = int(dom.get('nodesRemoved', 0) or 0)
+            self.mutation_count = int(dom.get('mutationCount') or 0)
+            self.nodes_added = int(dom.get('nodesAdded') or 0)
+            self.nodes_removed = int(dom.get('nodesRemoved') or 0)
             
             # Baseline
-            self.baseline_mutations = int(baseline.get('mutationCount', 0) or 0)
-            self.baseline_nodes = int(baseline.get('nodesAdded', 0) or 0) + int(baseline.get('nodesRemoved', 0) or 0)
+            self.baseline_mutations = int(baseline.get('mutationCount') or 0)
+            self.baseline_nodes = int(baseline.get('nodesAdded') or 0) + int(baseline.get('nodesRemoved') or 0)
             
             # Post-Click
-            self.postclick_mutations = int(postclick.get('mutationCount', 0) or 0)
-            self.postclick_nodes = int(postclick.get('nodesAdded', 0) or 0) + int(postclick.get('nodesRemoved', 0) or 0)
-            self.click_windows = postclick.get('windows') or []
+            self.postclick_mutations = int(postclick.get('mutationCount') or 0)
+            self.postclick_nodes = int(postclick.get('nodesAdded') or 0) + int(postclick.get('nodesRemoved') or 0)
+            self.click_window_count = int(postclick.get('windowCount') or 0)
             
-            self.container_mutations = dom.get('largeMutations', []) or []
+            large = dom.get('large') or {}
+            self._large_mutation_ts = large.get('ts') or []
+            self.container_mutations_count = len(self._large_mutation_ts)
+            self.container_mutations_sample = self._assemble_large_mutations(large)
+            self.dropped_mutations = int(dom.get('droppedMutations') or 0)
+            self.summary_mode = bool(dom.get('summaryMode', False))
             
             self._t0 = data.get('t0')
             current_time = data.get('currentTime', 0)
             if self._t0 and current_time:
                 self._observation_duration_ms = current_time - self._t0
             
-            self._initial_dom_metrics = dom.get('initial') or {"length": 0, "tagCount": 0}
-            self._final_dom_metrics = data.get('finalMetrics') or {"length": 0, "tagCount": 0}
+            self._initial_dom_metrics = dom.get('initial') or {"tagCount": 0}
+            self._final_dom_metrics = data.get('finalMetrics') or {"tagCount": 0}
             
             observer_active = dom.get('observerActive', False)
             
@@ -427,7 +671,8 @@ class DOMRewritingDetector:
                 f"  📊 BASELINE: {self.baseline_mutations} Mutations, {self.baseline_nodes} Node-Changes\n"
                 f"  🎯 POST-CLICK: {self.postclick_mutations} Mutations, {self.postclick_nodes} Node-Changes\n"
                 f"  📈 GESAMT: {self.mutation_count} Mutations, {self.nodes_added + self.nodes_removed} Node-Changes\n"
-                f"  🪟 Click-Windows: {len(self.click_windows)}"
+                f"  🪟 Click-Windows: {self.click_window_count}\n"
+                f"  ✂️  Verworfen (Batch-Limit): {self.dropped_mutations} Mutations"
             )
             
         except Exception as e:
@@ -438,69 +683,78 @@ class DOMRewritingDetector:
             self.baseline_mutations = 0
             self.postclick_mutations = 0
     
-    def analyze(self) -> DetectionResult:
+    @staticmethod
+    def _score(postclick_mutations: int, postclick_nodes: int,
+               baseline_mutations: int, mutation_count: int,
+               dom_growth_ratio: float, click_window_count: int) -> Tuple[bool, float, List[str]]:
         """
-        Analysiert DOM-Mutationen mit Fokus auf POST-CLICK Aktivität.
+        Reine Scoring-Funktion (keine Seiteneffekte, nur Zahlen rein/raus).
         
-        WICHTIG: Nur Post-Click Mutations zählen als starkes SPA-Signal!
-        Baseline-Mutations (Initial Load) werden weniger gewichtet.
+        WICHTIG: Post-Click ist das eigentliche SPA-Signal!
+        Returns: (detected, confidence, reasons)
         """
-        try:
-            total_node_changes = self.nodes_added + self.nodes_removed
-            
-            # WICHTIG: Post-Click ist das eigentliche SPA-Signal!
-            postclick_significant = self.postclick_mutations >= 10 or self.postclick_nodes >= 20
-            
-            detected = False
-            confidence = 0.0
-            reasons = []
-            
-            # ============================================
-            # NEUE LOGIK: Post-Click ist das Haupt-Signal
-            # ============================================
-            
-            # Starkes Signal: Viele Post-Click Mutations
-            if self.postclick_mutations >= 30 or self.postclick_nodes >= 50:
-                detected = True
-                confidence = 0.85
-                reasons.append(f"high_postclick={self.postclick_mutations}mut/{self.postclick_nodes}nodes")
-            
-            elif self.postclick_mutations >= 15 or self.postclick_nodes >= 30:
-                detected = True
-                confidence = 0.70
-                reasons.append(f"moderate_postclick={self.postclick_mutations}mut/{self.postclick_nodes}nodes")
-            
-            elif self.postclick_mutations >= 5 or self.postclick_nodes >= 10:
+        detected = False
+        confidence = 0.0
+        reasons = []
+        
+        # Post-Click Signal: erste (stärkste) erreichte Stufe gewinnt
+        for min_mutations, min_nodes, level_confidence, label in _POSTCLICK_THRESHOLDS:
+            if postclick_mutations >= min_mutations or postclick_nodes >= min_nodes:
                 detected = True
-                confidence = 0.50
-                reasons.append(f"some_postclick={self.postclick_mutations}mut/{self.postclick_nodes}nodes")
-            
+                confidence = level_confidence
+                reasons.append(f"{label}_postclick={postclick_mutations}mut/{postclick_nodes}nodes")
+                break
+        
+        if not detected:
             # Schwaches Signal: Nur Baseline-Aktivität (typisch für dynamische MPAs!)
-            elif self.baseline_mutations >= 50 and self.postclick_mutations < 5:
+            if baseline_mutations >= 50 and postclick_mutations < 5:
                 # Viel Baseline aber wenig Post-Click → wahrscheinlich MPA mit Ads/Consent
-                detected = False
-                confidence = 0.0
-                reasons.append(f"only_baseline={self.baseline_mutations}mut")
+                reasons.append(f"only_baseline={baseline_mutations}mut")
             
-            elif self.mutation_count >= 30 and self.postclick_mutations < 5:
+            elif mutation_count >= 30 and postclick_mutations < 5:
                 # Dynamische Seite aber keine SPA-Navigation
-                detected = False
-                confidence = 0.0
                 reasons.append("dynamic_but_no_spa_navigation")
+        
+        # DOM-Wachstum als unterstützendes Signal
+        if detected and dom_growth_ratio >= 1.5:
+            confidence = min(0.95, confidence + 0.1)
+            reasons.append(f"dom_growth={dom_growth_ratio:.1f}x")
+        
+        # Click-Windows als Bonus
+        if detected and click_window_count >= 3:
+            confidence = min(0.95, confidence + 0.05)
+            reasons.append(f"click_windows={click_window_count}")
+        
+        return detected, confidence, reasons
+    
+    def analyze(self) -> DetectionResult:
+        """
+        Analysiert DOM-Mutationen mit Fokus auf POST-CLICK Aktivität.
+        
+        WICHTIG: Nur Post-Click Mutations zählen als starkes SPA-Signal!
+        Baseline-Mutations (Initial Load) werden weniger gewichtet.
+        """
+        try:
+            total_node_changes = self.nodes_added + self.nodes_removed
             
             # DOM-Wachstum als unterstützendes Signal
-            initial_tags = self._initial_dom_metrics.get('tagCount', 0) if self._initial_dom_metrics else 0
-            final_tags = self._final_dom_metrics.get('tagCount', 0) if self._final_dom_metrics else 0
+            idm = self._initial_dom_metrics or {}
+            fdm = self._final_dom_metrics or {}
+            initial_tags = idm.get('tagCount', 0)
+            final_tags = fdm.get('tagCount', 0)
             dom_growth_ratio = (final_tags / max(1, initial_tags)) if initial_tags > 0 else 1.0
             
-            if detected and dom_growth_ratio >= 1.5:
-                confidence = min(0.95, confidence + 0.1)
-                reasons.append(f"dom_growth={dom_growth_ratio:.1f}x")
+            detected, confidence, reasons = self._score(
+                self.postclick_mutations, self.postclick_nodes,
+                self.baseline_mutations, self.mutation_count,
+                dom_growth_ratio, self.click_window_count
+            )
             
-            # Click-Windows als Bonus
-            if detected and len(self.click_windows) >= 3:
-                confidence = min(0.95, confidence + 0.05)
-                reasons.append(f"click_windows={len(self.click_windows)}")
+            # Early/Late-Aufteilung der großen Mutations (performance.now() ist monoton)
+            early_large = 0
+            if self._t0 is not None:
+                early_large = bisect_right(self._large_mutation_ts, self._t0 + self.early_ms)
+            late_large = len(self._large_mutation_ts) - early_large
             
             evidence = {
                 # Baseline vs. Post-Click (NEU!)
@@ -508,7 +762,7 @@ class DOMRewritingDetector:
                 'baseline_nodes': self.baseline_nodes,
                 'postclick_mutations': self.postclick_mutations,
                 'postclick_nodes': self.postclick_nodes,
-                'click_windows': len(self.click_windows),
+                'click_windows': self.click_window_count,
                 
                 # Gesamt
                 'mutation_count': self.mutation_count,
@@ -523,8 +777,13 @@ class DOMRewritingDetector:
                 
                 # Meta
                 'observation_duration_ms': self._observation_duration_ms,
+                'early_large_mutations': early_large,
+                'late_large_mutations': late_large,
+                'dropped_mutations': self.dropped_mutations,
+                'summary_mode': self.summary_mode,
                 'detection_reasons': reasons,
-                'sample_mutations': self.container_mutations[:5]
+                'large_mutations': self.container_mutations_count,
+                'sample_mutations': self.container_mutations_sample
             }
             
             if detected:
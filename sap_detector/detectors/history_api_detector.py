@@ -8,10 +8,32 @@ FIXES:
 3. Bessere Fehlerbehandlung bei zerstörtem Context
 """
 import logging
+from bisect import bisect_right
+from typing import Optional, Dict
 from .detection_result import DetectionResult
+from .script_utils import minify_script
 
 logger = logging.getLogger(__name__)
 
+# Basis-Confidence nach Anzahl History-Calls (Index = min(Calls, 5))
+_BASE_CONFIDENCE = (
+    (0.0, None),
+    (0.50, "history_calls"),
+    (0.50, "history_calls"),
+    (0.70, "mehrere_history_calls"),
+    (0.70, "mehrere_history_calls"),
+    (0.85, "viele_history_calls"),
+)
+
+# Anpassung nach Verhältnis History-Calls / Frame-Navigations:
+# Grenzen aufsteigend, Einträge = (Delta, Untergrenze, Reason) für < 0.5, < 1, < 2, >= 2
+_RATIO_BOUNDS = (0.5, 1, 2)
+_RATIO_ADJUSTMENT = (
+    (-0.2, 0.2, "meist_frame_navigation"),  # Sehr wenige History-Calls vs Frame-Navs
+    (-0.1, 0.3, "gemischte_navigation"),    # Weniger History-Calls → leichter Abzug
+    (0.0, 0.0, None),                       # Gleich viele → neutral
+    (0.1, 0.0, "gutes_ratio"),              # Doppelt so viele History-Calls → Bonus
+)
 
 # JavaScript Code als Konstante (wird bei jeder Navigation injiziert)
 HISTORY_MONITOR_SCRIPT = """
@@ -26,17 +48,42 @@ HISTORY_MONITOR_SCRIPT = """
         replaceStateCount: 0,
         popStateCount: 0,
         urlChanges: [],
+        urlChangeCount: 0,
         injectionTime: Date.now(),
         currentUrl: location.href
     };
     
+    // URL-Changes begrenzt im Page-Heap halten: die ersten MAX_URL_CHANGES
+    // bleiben (analyze() zeigt die ersten), danach wird nur noch gezählt
+    const MAX_URL_CHANGES = 256;
+    
+    // Events sofort an Python melden (page.expose_function) - überlebt Navigationen.
+    // Nur das Top-Level-Fenster meldet, iframes zählen nicht als Seiten-Navigation.
+    const isTopWindow = window === window.top;
+    const emitHistory = (entry) => {
+        if (isTopWindow && typeof window.__spa_history_emit === 'function') {
+            const p = window.__spa_history_emit(entry);
+            if (p && p.catch) p.catch(() => {});
+        }
+    };
+    
+    // Neues Dokument: wie im Polling-Modus zählt nur dessen Verlauf
+    emitHistory({ type: 'navigation', url: location.href, timestamp: Date.now() });
+    
+    const recordUrlChange = (entry) => {
+        const h = window.__spa_detection.history;
+        h.urlChangeCount++;
+        if (h.urlChanges.length < MAX_URL_CHANGES) h.urlChanges.push(entry);
+        emitHistory(entry);
+    };
+    
     // Hook pushState
     const originalPushState = history.pushState;
     history.pushState = function(...args) {
         try {
             window.__spa_detection.history.pushStateCount++;
             const newUrl = args[2] || location.href;
-            window.__spa_detection.history.urlChanges.push({
+            recordUrlChange({
                 type: 'pushState',
                 url: newUrl,
                 fromUrl: window.__spa_detection.history.currentUrl,
@@ -56,7 +103,7 @@ HISTORY_MONITOR_SCRIPT = """
         try {
             window.__spa_detection.history.replaceStateCount++;
             const newUrl = args[2] || location.href;
-            window.__spa_detection.history.urlChanges.push({
+            recordUrlChange({
                 type: 'replaceState',
                 url: newUrl,
                 fromUrl: window.__spa_detection.history.currentUrl,
@@ -74,7 +121,7 @@ HISTORY_MONITOR_SCRIPT = """
     window.addEventListener('popstate', () => {
         try {
             window.__spa_detection.history.popStateCount++;
-            window.__spa_detection.history.urlChanges.push({
+            recordUrlChange({
                 type: 'popstate',
                 url: location.href,
                 timestamp: Date.now()
@@ -89,20 +136,70 @@ HISTORY_MONITOR_SCRIPT = """
     console.log('[SPA-Detection] History monitor initialized at:', location.href);
 })();
 """
+# Einmal beim Import verkleinert - wird bei jedem add_init_script/evaluate übertragen
+HISTORY_MONITOR_SCRIPT = minify_script(HISTORY_MONITOR_SCRIPT)
+
+# Feste Reihenfolge statt Objekt (keine Key-Namen im Payload):
+# [pushStateCount, replaceStateCount, popStateCount, urlChanges (erste 5), urlChangeCount, injected]
+HISTORY_COLLECT_SCRIPT = """
+() => {
+    if (!window.__spa_detection || !window.__spa_detection.history) {
+        return [0, 0, 0, [], 0, false];
+    }
+    // Nur die Samples übertragen, die analyze() zeigt - Rest bleibt im Browser
+    const h = window.__spa_detection.history;
+    return [
+        h.pushStateCount,
+        h.replaceStateCount,
+        h.popStateCount,
+        h.urlChanges.slice(0, 5),
+        h.urlChangeCount,
+        true
+    ];
+}
+"""
+
+# Beim Detektor-Setup: Zähler des aktuellen Dokuments auf 0 (Framework-Bootstrap
+# vor dem Setup zählt nicht als History-Nutzung)
+HISTORY_RESET_SCRIPT = """
+() => {
+    const h = window.__spa_detection && window.__spa_detection.history;
+    if (!h) return false;
+    h.pushStateCount = 0;
+    h.replaceStateCount = 0;
+    h.popStateCount = 0;
+    h.urlChanges = [];
+    h.urlChangeCount = 0;
+    h.currentUrl = location.href;
+    return true;
+}
+"""
 
 
 class HistoryAPIDetector:
     """Signal 1: History-API + URL-Änderung ohne Reload"""
     
+    COLLECT_SCRIPT = HISTORY_COLLECT_SCRIPT
+    
+    # Kein __dict__ pro Instanz
+    __slots__ = (
+        "pushstate_count", "replacestate_count", "popstate_count",
+        "url_changes_count", "url_changes_sample",
+        "frame_navigations", "initial_url", "_push_active", "_main_frame",
+    )
+    
     def __init__(self):
         self.pushstate_count = 0
         self.replacestate_count = 0
         self.popstate_count = 0
-        self.url_changes = []
+        self.url_changes_count = 0
+        self.url_changes_sample = []
         self.frame_navigations = 0
         self.initial_url = None
-        self._init_script_added = False
-        self._context = None
+        self._main_frame = None
+        
+        # True sobald Events per expose_function direkt in Python ankommen
+        self._push_active = False
         
     async def inject_monitors(self, page):
         """
@@ -113,68 +210,130 @@ class HistoryAPIDetector:
         """
         try:
             self.initial_url = page.url
-            self._context = page.context
+            # Main-Frame einmal merken statt pro Event frame.page.main_frame aufzulösen
+            self._main_frame = page.main_frame
+            
+            # Vor dem Script registrieren, damit schon die ersten Hooks melden können
+            try:
+                await page.expose_function("__spa_history_emit", self._on_history_event)
+                self._push_active = True
+            except Exception as e:
+                logger.debug("History-Push nicht verfügbar, Fallback auf Polling: %s", e)
             
             # add_init_script() wird bei JEDER Navigation ausgeführt!
             # Das ist der Schlüssel - der Script überlebt Browser-Navigationen
-            if not self._init_script_added:
-                await page.context.add_init_script(HISTORY_MONITOR_SCRIPT)
-                self._init_script_added = True
+            # Lazy: init_script importiert die Detektor-Skripte
+            from .init_script import ensure_init_script
+            if await ensure_init_script(page.context, 'history', HISTORY_MONITOR_SCRIPT):
                 logger.info("History-API Monitor als InitScript registriert")
+                
+                # Nur das bereits geladene Dokument hat das InitScript verpasst -
+                # spätere Dokumente im Context bekommen es beim document_start
+                try:
+                    await page.evaluate(HISTORY_MONITOR_SCRIPT)
+                except Exception as e:
+                    logger.debug("Initiale Injection übersprungen (bereits geladen): %s", e)
             
-            # Auch für die aktuelle Seite injizieren (falls schon geladen)
+            # Zählung beginnt mit dem Setup (Hooks laufen ggf. schon ab document_start)
             try:
-                await page.evaluate(HISTORY_MONITOR_SCRIPT)
+                await page.evaluate(HISTORY_RESET_SCRIPT)
             except Exception as e:
-                logger.debug(f"Initiale Injection übersprungen (bereits geladen): {e}")
+                logger.debug("History-Reset übersprungen: %s", e)
+            self._reset_counts()
             
-            # Track frame navigations
-            page.on("framenavigated", lambda frame: self._on_frame_navigated(frame))
+            # Track frame navigations (gebundene Methode - beim Schließen wieder lösbar)
+            page.on("framenavigated", self._on_frame_navigated)
+            page.once("close", self._remove_listeners)
             logger.info("History-API Monitor injiziert")
             
         except Exception as e:
             logger.error(f"Fehler beim Injizieren des History-Monitors: {e}")
     
+    def _remove_listeners(self, page):
+        """Löst die Page-Listener, damit die Page den Detector nicht am Leben hält"""
+        try:
+            page.remove_listener("framenavigated", self._on_frame_navigated)
+        except Exception as e:
+            logger.debug("Listener-Entfernung fehlgeschlagen: %s", e)
+    
+    def _reset_counts(self):
+        """Setzt die History-Zähler zurück (Frame-Navigations bleiben)"""
+        self.pushstate_count = 0
+        self.replacestate_count = 0
+        self.popstate_count = 0
+        self.url_changes_count = 0
+        self.url_changes_sample = []
+    
+    def _on_history_event(self, entry: Dict):
+        """Empfängt pushState/replaceState/popstate direkt aus der Page"""
+        try:
+            event_type = entry.get('type')
+            if event_type == 'navigation':
+                # Neues Dokument: wie im Polling-Modus (und wie beim Title-Push)
+                # zählt nur dessen Verlauf
+                self._reset_counts()
+                return
+            if event_type == 'pushState':
+                self.pushstate_count += 1
+            elif event_type == 'replaceState':
+                self.replacestate_count += 1
+            elif event_type == 'popstate':
+                self.popstate_count += 1
+            else:
+                return
+            
+            self.url_changes_count += 1
+            if len(self.url_changes_sample) < 5:
+                self.url_changes_sample.append(entry)
+        except Exception as e:
+            logger.debug("History-Event Fehler: %s", e)
+    
     def _on_frame_navigated(self, frame):
         """Zählt echte Browser-Navigationen (Frame-Navigations)"""
         try:
-            if frame == frame.page.main_frame:
+            # Identitätsvergleich - iframe-Navigationen (Ads etc.) fallen sofort raus
+            if frame is self._main_frame:
                 self.frame_navigations += 1
-                logger.debug(f"Frame-Navigation #{self.frame_navigations}: {frame.url}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Frame-Navigation #%d: %s", self.frame_navigations, frame.url)
         except Exception as e:
-            logger.error(f"Frame-Navigation Tracking Fehler: {e}")
+            logger.error("Frame-Navigation Tracking Fehler: %s", e)
     
-    async def collect_data(self, page):
-        """Sammelt die History-API Daten mit Fehlerbehandlung"""
+    async def collect_data(self, page, data: Optional[Dict] = None):
+        """Sammelt die History-API Daten mit Fehlerbehandlung (data: bereits geholtes COLLECT_SCRIPT-Ergebnis)"""
         try:
-            data = await page.evaluate("""
-                () => {
-                    if (!window.__spa_detection || !window.__spa_detection.history) {
-                        return {
-                            pushStateCount: 0,
-                            replaceStateCount: 0,
-                            popStateCount: 0,
-                            urlChanges: [],
-                            injected: false
-                        };
-                    }
-                    return {
-                        ...window.__spa_detection.history,
-                        injected: true
-                    };
-                }
-            """)
+            if data is None:
+                try:
+                    data = await page.evaluate(self.COLLECT_SCRIPT)
+                except Exception as e:
+                    if not self._push_active:
+                        raise
+                    # Push-Modus: gemeldete Zähler bleiben gültig
+                    logger.debug("History-Polling im Push-Modus fehlgeschlagen: %s", e)
             
-            self.pushstate_count = data.get('pushStateCount', 0)
-            self.replacestate_count = data.get('replaceStateCount', 0)
-            self.popstate_count = data.get('popStateCount', 0)
-            self.url_changes = data.get('urlChanges', [])
+            if data is not None:
+                (pushstate, replacestate, popstate,
+                 sample, url_changes, _injected) = data
+                
+                if self._push_active:
+                    # Page-Zähler enthalten auch Events, die vor dem Binding von
+                    # __spa_history_emit lagen - pro Zähler das Maximum nehmen
+                    pushstate = max(pushstate, self.pushstate_count)
+                    replacestate = max(replacestate, self.replacestate_count)
+                    popstate = max(popstate, self.popstate_count)
+                    if url_changes < self.url_changes_count:
+                        sample = self.url_changes_sample
+                    url_changes = max(url_changes, self.url_changes_count)
+                
+                self.pushstate_count = pushstate
+                self.replacestate_count = replacestate
+                self.popstate_count = popstate
+                self.url_changes_sample = sample
+                self.url_changes_count = url_changes
             
-            injected = data.get('injected', False)
-            logger.info(f"History-Daten: {self.pushstate_count} pushState, "
-                       f"{self.replacestate_count} replaceState, "
-                       f"{self.popstate_count} popstate "
-                       f"(Script aktiv: {injected})")
+            logger.info("History-Daten: %d pushState, %d replaceState, %d popstate (Push: %s)",
+                        self.pushstate_count, self.replacestate_count, self.popstate_count,
+                        self._push_active)
             
         except Exception as e:
             # Bei "Execution context was destroyed" - das passiert bei Navigation
@@ -204,35 +363,17 @@ class HistoryAPIDetector:
                 detected = True
                 
                 # Basis-Confidence basierend auf Anzahl der History-Calls
-                if total_history_calls >= 5:
-                    confidence = 0.85
-                    reasons.append(f"viele_history_calls={total_history_calls}")
-                elif total_history_calls >= 3:
-                    confidence = 0.70
-                    reasons.append(f"mehrere_history_calls={total_history_calls}")
-                elif total_history_calls >= 1:
-                    confidence = 0.50
-                    reasons.append(f"history_calls={total_history_calls}")
+                confidence, label = _BASE_CONFIDENCE[min(total_history_calls, 5)]
+                reasons.append(f"{label}={total_history_calls}")
                 
                 # Abzug für Frame-Navigations (aber nicht zu stark!)
                 # Verhältnis: Wenn mehr Frame-Navigations als History-Calls → reduziere
                 if self.frame_navigations > 0:
                     ratio = total_history_calls / self.frame_navigations
-                    if ratio >= 2:
-                        # Doppelt so viele History-Calls wie Frame-Navs → Bonus
-                        confidence = min(0.95, confidence + 0.1)
-                        reasons.append("gutes_ratio")
-                    elif ratio >= 1:
-                        # Gleich viele → neutral
-                        pass
-                    elif ratio >= 0.5:
-                        # Weniger History-Calls → leichter Abzug
-                        confidence = max(0.3, confidence - 0.1)
-                        reasons.append("gemischte_navigation")
-                    else:
-                        # Sehr wenige History-Calls vs Frame-Navs → stärkerer Abzug
-                        confidence = max(0.2, confidence - 0.2)
-                        reasons.append("meist_frame_navigation")
+                    delta, floor, reason = _RATIO_ADJUSTMENT[bisect_right(_RATIO_BOUNDS, ratio)]
+                    if reason:
+                        confidence = min(0.95, max(floor, confidence + delta))
+                        reasons.append(reason)
             
             # Wenn gar keine History-Calls aber viele Frame-Navigations
             elif self.frame_navigations > 2:
@@ -246,8 +387,8 @@ class HistoryAPIDetector:
                 'popstate_count': self.popstate_count,
                 'total_history_calls': total_history_calls,
                 'frame_navigations': self.frame_navigations,
-                'url_changes': len(self.url_changes),
-                'sample_changes': self.url_changes[:5],
+                'url_changes': self.url_changes_count,
+                'sample_changes': self.url_changes_sample,
                 'detection_reasons': reasons,
                 'history_to_frame_ratio': (
                     total_history_calls / max(1, self.frame_navigations)
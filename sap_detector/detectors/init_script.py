@@ -0,0 +1,72 @@
+"""
+SPA Detection Tool - Kombiniertes InitScript
+History-, DOM- und Title-Hooks als EIN add_init_script pro Browser-Context
+"""
+import logging
+import weakref
+from .history_api_detector import HISTORY_MONITOR_SCRIPT
+from .dom_rewriting_detector import DOM_OBSERVER_SCRIPT
+from .title_change_detector import TITLE_OBSERVER_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Browser-Context → Namen der dort bereits registrierten Detektor-InitScripts
+# (prozessweit, Context-Reuse über viele URLs)
+_REGISTERED_SCRIPTS = weakref.WeakKeyDictionary()
+_DETECTOR_SCRIPTS = frozenset({'history', 'dom', 'title'})
+
+# Gemeinsame Präambel: Root-Objekt einmal anlegen und den ganzen Block pro
+# Dokument nur einmal ausführen. Die Einzelskripte bleiben eigenständig
+# idempotent (eigene __spa_detection_*_injected-Flags), da die Detektoren sie
+# im Fallback auch einzeln injizieren.
+SPA_INIT_SCRIPT = (
+    "(() => {\n"
+    "    if (window.__spa_detection_hooks_installed) return;\n"
+    "    window.__spa_detection = window.__spa_detection || {};\n"
+    # Resource-Timing-Puffer (Default 250) vergrößern - sonst wirken ressourcenreiche
+    # Seiten für die Ruhe-Erkennung (main.py, scroll_page) sofort ruhig
+    "    if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(5000);\n"
+    + "\n;\n".join([HISTORY_MONITOR_SCRIPT, DOM_OBSERVER_SCRIPT, TITLE_OBSERVER_SCRIPT])
+    + "\n;\n    window.__spa_detection_hooks_installed = true;\n"
+    "})();\n"
+)
+
+
+
+async def ensure_init_script(context, name: str, script: str) -> bool:
+    """
+    Registriert das InitScript eines Detektors einmal pro Context
+    (name: 'history', 'dom' oder 'title').
+    Returns: True wenn neu registriert
+    """
+    names = _REGISTERED_SCRIPTS.setdefault(context, set())
+    if name in names:
+        return False
+    
+    await context.add_init_script(script)
+    names.add(name)
+    return True
+
+
+async def register_init_script(context) -> bool:
+    """
+    Registriert alle Detektor-Hooks direkt beim Erstellen des Contexts.
+    
+    Damit sind die Hooks schon im ERSTEN Dokument vor allen Seiten-Skripten
+    installiert (auch Router, die history.pushState beim Laden zwischenspeichern,
+    laufen über die Hooks), und die Detektoren überspringen ihr eigenes
+    add_init_script.
+    
+    Gezählt wird trotzdem erst ab dem Detektor-Setup: setup() setzt History-
+    und Title-Zähler sowie die DOM-Baseline zurück. Bootstrap-pushState/
+    replaceState und Lade-Mutationen zählen also wie bisher nicht als Signal.
+    Returns: True wenn neu registriert
+    """
+    names = _REGISTERED_SCRIPTS.setdefault(context, set())
+    if _DETECTOR_SCRIPTS <= names:
+        return False
+    
+    await context.add_init_script(SPA_INIT_SCRIPT)
+    names.update(_DETECTOR_SCRIPTS)
+    logger.info("Detektor-Hooks als gemeinsames InitScript registriert")
+    return True
@@ -7,47 +7,96 @@ Signal 2: XHR/Fetch statt Dokument-Navigations
 - Filterung von Analytics/Tracking Requests
 - Nur Post-Click API-Calls zählen als starkes SPA-Signal
 """
-import asyncio
 import logging
+import re
+import time
+from urllib.parse import urlsplit
 from typing import List, Dict
 from .detection_result import DetectionResult
 
 logger = logging.getLogger(__name__)
 
+# analyze() zeigt nur die ersten URLs pro Phase - mehr wird nicht aufbewahrt
+SAMPLE_LIMIT = 3
 
-# Domains die ignoriert werden (Analytics, Tracking, Ads)
-IGNORED_DOMAINS = [
-    'google-analytics.com', 'googletagmanager.com', 'google.com/pagead',
+# JSON-Content-Types als Präfixe (Parameter wie '; charset=utf-8' folgen dahinter)
+JSON_CONTENT_TYPES = ("application/json", "application/ld+json")
+
+# Nur diese Resource-Types werden gezählt (Bilder, Fonts, Scripts etc. sofort verwerfen)
+TRACKED_RESOURCE_TYPES = frozenset({"xhr", "fetch", "document"})
+
+# Nur API-Antworten können JSON-Responses liefern, die als Signal zählen
+API_RESOURCE_TYPES = frozenset({"xhr", "fetch"})
+
+
+# Hosts die ignoriert werden (Analytics, Tracking, Ads) - exakt oder als Subdomain,
+# per Set-Lookup statt Substring-Suche über die ganze URL
+IGNORED_HOSTS = frozenset({
+    'google-analytics.com', 'googletagmanager.com',
     'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
-    'facebook.com/tr', 'facebook.net', 'connect.facebook',
-    'analytics', 'tracking', 'pixel', 'beacon',
+    'facebook.net',
     'hotjar.com', 'fullstory.com', 'mouseflow.com',
     'segment.io', 'segment.com', 'mixpanel.com',
     'amplitude.com', 'heapanalytics.com',
     'newrelic.com', 'nr-data.net',
     'sentry.io', 'bugsnag.com',
-    'cloudflare.com/cdn-cgi', 'challenges.cloudflare.com',
+    'challenges.cloudflare.com',
+    'criteo.com', 'outbrain.com', 'taboola.com',
+})
+
+# Echte Substring-Patterns (Pfade, Schlüsselwörter) - weiterhin gegen die ganze URL
+IGNORED_URL_PATTERNS = (
+    'google.com/pagead', 'facebook.com/tr', 'connect.facebook',
+    'analytics', 'tracking', 'pixel', 'beacon',
+    'cloudflare.com/cdn-cgi',
     'recaptcha', 'hcaptcha',
     'ads.', 'ad.', 'adserver', 'adservice',
-    'criteo.com', 'outbrain.com', 'taboola.com',
     'linkedin.com/px', 'twitter.com/i/jot',
-    'tiktok.com/api/v1/log', 'tiktok.com/captcha'
-]
+    'tiktok.com/api/v1/log', 'tiktok.com/captcha',
+)
+
+# Alle Patterns als eine Alternation: ein C-Scan pro URL statt Python-Schleife über die Liste.
+# IGNORECASE statt url.lower() - keine Kopie der URL pro Request/Response
+_IGNORED_URL_RE = re.compile('|'.join(map(re.escape, IGNORED_URL_PATTERNS)), re.IGNORECASE)
+
+
+def _is_ignored_host(host: str) -> bool:
+    """Prüft Host und alle übergeordneten Domains gegen IGNORED_HOSTS"""
+    while host:
+        if host in IGNORED_HOSTS:
+            return True
+        dot = host.find('.')
+        if dot < 0:
+            return False
+        host = host[dot + 1:]
+    return False
 
 
 class NetworkActivityDetector:
     """Signal 2: XHR/Fetch statt Dokument-Navigations (v4)"""
     
+    # Kein __dict__ pro Instanz; Listener greifen pro Request auf diese Felder zu
+    __slots__ = (
+        "xhr_count", "fetch_count", "document_count", "json_responses",
+        "baseline_api_count", "postclick_api_count",
+        "baseline_samples", "postclick_samples",
+        "_listeners_setup", "_baseline_end_time",
+        "_current_click_window", "_click_windows",
+        "_baseline_duration_sec", "_start_time",
+    )
+    
     def __init__(self):
-        # Gesamt
-        self.xhr_requests: List[Dict] = []
-        self.fetch_requests: List[Dict] = []
-        self.document_requests: List[Dict] = []
+        # Gesamt (nur Zähler - einzelne Requests werden nicht aufbewahrt)
+        self.xhr_count = 0
+        self.fetch_count = 0
+        self.document_count = 0
         self.json_responses = 0
         
         # NEU: Baseline vs. Post-Click
-        self.baseline_api_requests: List[Dict] = []
-        self.postclick_api_requests: List[Dict] = []
+        self.baseline_api_count = 0
+        self.postclick_api_count = 0
+        self.baseline_samples: List[str] = []
+        self.postclick_samples: List[str] = []
         
         # Tracking
         self._listeners_setup = False
@@ -65,113 +114,130 @@ class NetworkActivityDetector:
             if self._listeners_setup:
                 return
             
-            self._start_time = asyncio.get_event_loop().time()
+            self._start_time = time.monotonic()
+            # Absolute Grenze einmal berechnen - pro Request nur noch ein Vergleich
+            self._baseline_end_time = self._start_time + self._baseline_duration_sec
             
             page.on("request", self._on_request)
             page.on("response", self._on_response)
+            page.once("close", self._remove_listeners)
             self._listeners_setup = True
             logger.info("Network-Listener eingerichtet (v4 - Baseline/Post-Click)")
             
         except Exception as e:
             logger.error(f"Fehler beim Setup der Network-Listener: {e}")
     
+    def _remove_listeners(self, page):
+        """Löst die Page-Listener, damit die Page den Detector nicht am Leben hält"""
+        try:
+            page.remove_listener("request", self._on_request)
+            page.remove_listener("response", self._on_response)
+        except Exception as e:
+            logger.debug("Listener-Entfernung fehlgeschlagen: %s", e)
+    
     def _is_ignored_url(self, url: str) -> bool:
         """Prüft ob URL ignoriert werden soll (Analytics/Tracking)"""
-        url_lower = url.lower()
-        for pattern in IGNORED_DOMAINS:
-            if pattern in url_lower:
-                return True
-        return False
+        try:
+            host = urlsplit(url).hostname  # bereits lower-case
+        except ValueError:
+            host = None
+        if host and _is_ignored_host(host):
+            return True
+        return _IGNORED_URL_RE.search(url) is not None
     
     def _on_request(self, request):
         try:
+            # Günstiger Type-Check zuerst - die meisten Subresources enden hier
             resource_type = request.resource_type
-            timestamp = asyncio.get_event_loop().time()
+            if resource_type not in TRACKED_RESOURCE_TYPES:
+                return  # Andere Typen ignorieren
+            
             url = request.url
             
             # Ignoriere Analytics/Tracking
             if self._is_ignored_url(url):
                 return
             
-            request_data = {
-                'url': url,
-                'method': request.method,
-                'timestamp': timestamp,
-                'resource_type': resource_type
-            }
-            
             # Kategorisieren
             if resource_type == "xhr":
-                self.xhr_requests.append(request_data)
+                self.xhr_count += 1
             elif resource_type == "fetch":
-                self.fetch_requests.append(request_data)
-            elif resource_type == "document":
-                self.document_requests.append(request_data)
-                return  # Document-Requests nicht als API zählen
+                self.fetch_count += 1
             else:
-                return  # Andere Typen ignorieren
+                self.document_count += 1
+                return  # Document-Requests nicht als API zählen
             
             # In Baseline oder Post-Click einsortieren
-            if self._start_time is None:
-                self._start_time = timestamp
-            
-            time_since_start = timestamp - self._start_time
-            
-            if time_since_start <= self._baseline_duration_sec:
+            # (Zeit nur für API-Requests lesen; monotonic() statt Event-Loop-Lookup)
+            if time.monotonic() <= self._baseline_end_time:
                 # BASELINE Phase
-                self.baseline_api_requests.append(request_data)
-            elif self._current_click_window:
-                # POST-CLICK Phase (aktives Fenster)
-                self.postclick_api_requests.append(request_data)
-                self._current_click_window['requests'].append(request_data)
-            else:
-                # Nach Baseline, aber kein aktives Click-Window
-                # Trotzdem als Post-Click zählen (könnte verzögerte SPA-Aktivität sein)
-                self.postclick_api_requests.append(request_data)
+                self.baseline_api_count += 1
+                if len(self.baseline_samples) < SAMPLE_LIMIT:
+                    self.baseline_samples.append(url[:80])
+                return
+            
+            # POST-CLICK Phase - auch ohne aktives Click-Window zählen
+            # (könnte verzögerte SPA-Aktivität sein). Fenster-Zähler ergeben sich
+            # beim Schließen aus der Differenz, kein Zugriff aufs Fenster pro Request
+            self.postclick_api_count += 1
+            if len(self.postclick_samples) < SAMPLE_LIMIT:
+                self.postclick_samples.append(url[:80])
                 
         except Exception as e:
-            logger.error(f"Request-Tracking Fehler: {e}")
+            logger.error("Request-Tracking Fehler: %s", e)
     
     def _on_response(self, response):
         try:
-            url = response.url
+            # Type-Check vor dem Header-Zugriff - Dokumente, Bilder, Scripts etc. fallen sofort raus
+            if response.request.resource_type not in API_RESOURCE_TYPES:
+                return
+            
+            content_type = response.headers.get('content-type', '')
+            
+            # Ein Präfix-Vergleich (auch "Application/JSON" u.ä. Schreibweisen)
+            if not content_type.lower().startswith(JSON_CONTENT_TYPES):
+                return
             
             # Ignoriere Analytics/Tracking
-            if self._is_ignored_url(url):
+            if self._is_ignored_url(response.url):
                 return
             
-            content_type = response.headers.get('content-type', '').lower()
-            if 'application/json' in content_type or 'application/ld+json' in content_type:
-                self.json_responses += 1
+            self.json_responses += 1
         except Exception as e:
-            logger.error(f"Response-Tracking Fehler: {e}")
+            logger.error("Response-Tracking Fehler: %s", e)
     
     def start_click_window(self, label: str = "click"):
         """Startet ein neues Click-Measurement-Window"""
-        timestamp = asyncio.get_event_loop().time()
+        timestamp = time.monotonic()
         
         # Schließe vorheriges Fenster
         if self._current_click_window:
-            self._current_click_window['end_time'] = timestamp
-            self._click_windows.append(self._current_click_window)
+            self._close_click_window(timestamp)
         
         self._current_click_window = {
             'label': label,
             'start_time': timestamp,
             'end_time': None,
-            'requests': []
+            'start_count': self.postclick_api_count,
+            'request_count': 0
         }
-        logger.debug(f"Network Click-Window gestartet: {label}")
+        logger.debug("Network Click-Window gestartet: %s", label)
     
     def end_click_window(self):
         """Beendet das aktuelle Click-Measurement-Window"""
         if self._current_click_window:
-            timestamp = asyncio.get_event_loop().time()
-            self._current_click_window['end_time'] = timestamp
-            self._click_windows.append(self._current_click_window)
-            logger.debug(f"Network Click-Window beendet: {len(self._current_click_window['requests'])} Requests")
+            window = self._close_click_window(time.monotonic())
+            logger.debug("Network Click-Window beendet: %d Requests", window['request_count'])
             self._current_click_window = None
     
+    def _close_click_window(self, timestamp: float) -> Dict:
+        """Schließt das aktuelle Fenster ab und archiviert es"""
+        window = self._current_click_window
+        window['end_time'] = timestamp
+        window['request_count'] = self.postclick_api_count - window['start_count']
+        self._click_windows.append(window)
+        return window
+    
     def analyze(self) -> DetectionResult:
         """
         Analysiert Netzwerkaktivität mit Fokus auf POST-CLICK Aktivität.
@@ -180,10 +246,10 @@ class NetworkActivityDetector:
         Baseline-Requests (Initial Load) werden weniger gewichtet.
         """
         try:
-            total_api_requests = len(self.xhr_requests) + len(self.fetch_requests)
-            baseline_count = len(self.baseline_api_requests)
-            postclick_count = len(self.postclick_api_requests)
-            doc_requests = len(self.document_requests)
+            total_api_requests = self.xhr_count + self.fetch_count
+            baseline_count = self.baseline_api_count
+            postclick_count = self.postclick_api_count
+            doc_requests = self.document_count
             
             detected = False
             confidence = 0.0
@@ -216,23 +282,27 @@ class NetworkActivityDetector:
                 confidence = 0.0
                 reasons.append(f"only_baseline_api={baseline_count}")
             
+            # Zu- und Abschläge aufsummieren, am Ende einmal auf [0, 0.95] begrenzen
+            
             # JSON-Responses als unterstützendes Signal
             if detected and self.json_responses >= 5:
-                confidence = min(0.95, confidence + 0.1)
+                confidence += 0.1
                 reasons.append(f"json_responses={self.json_responses}")
             
             # Document-Requests als Gegen-Signal
             if doc_requests >= 3:
-                confidence = max(0.0, confidence - 0.15)
+                confidence -= 0.15
                 reasons.append(f"many_doc_requests={doc_requests}")
             
             # Ratio als zusätzliches Signal (nur wenn Post-Click vorhanden)
             if postclick_count > 0 and doc_requests > 0:
                 ratio = postclick_count / doc_requests
                 if ratio >= 5:
-                    confidence = min(0.95, confidence + 0.1)
+                    confidence += 0.1
                     reasons.append(f"good_ratio={ratio:.1f}")
             
+            confidence = max(0.0, min(0.95, confidence)) if detected else 0.0
+            
             evidence = {
                 # Baseline vs. Post-Click (NEU!)
                 'baseline_api_requests': baseline_count,
@@ -240,8 +310,8 @@ class NetworkActivityDetector:
                 'click_windows': len(self._click_windows),
                 
                 # Gesamt
-                'xhr_count': len(self.xhr_requests),
-                'fetch_count': len(self.fetch_requests),
+                'xhr_count': self.xhr_count,
+                'fetch_count': self.fetch_count,
                 'total_api_requests': total_api_requests,
                 'document_requests': doc_requests,
                 'json_responses': self.json_responses,
@@ -250,8 +320,8 @@ class NetworkActivityDetector:
                 'postclick_to_doc_ratio': postclick_count / max(1, doc_requests),
                 
                 # Samples
-                'sample_baseline': [r['url'][:80] for r in self.baseline_api_requests[:3]],
-                'sample_postclick': [r['url'][:80] for r in self.postclick_api_requests[:3]],
+                'sample_baseline': list(self.baseline_samples),
+                'sample_postclick': list(self.postclick_samples),
                 
                 'detection_reasons': reasons
             }
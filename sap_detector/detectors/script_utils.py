@@ -0,0 +1,14 @@
+"""
+SPA Detection Tool - Hilfsfunktionen für injizierte JavaScript-Snippets
+"""
+import re
+
+# Ganze Zeilen, die im Browser nichts bewirken: Kommentare und Debug-Ausgaben.
+# Nur ein einzelner Aufruf ohne ';' im Argument - "console.log(x); doWork();" bleibt stehen
+_STRIP_LINE_RE = re.compile(r"^\s*(?://.*|console\.(?:log|debug)\([^;]*\);)\s*$")
+
+
+def minify_script(script: str) -> str:
+    """Entfernt Kommentar-/Log-Zeilen, Einrückung und Leerzeilen (zeilenweise, Strings bleiben unberührt)"""
+    lines = (line.strip() for line in script.splitlines())
+    return "\n".join(line for line in lines if line and not _STRIP_LINE_RE.match(line))
@@ -7,11 +7,22 @@ FIXES:
 2. Akkumuliert Title-Changes über Navigationen hinweg
 """
 import logging
+from itertools import islice
+from typing import Optional, Dict
 from .detection_result import DetectionResult
+from .script_utils import minify_script
 
 logger = logging.getLogger(__name__)
 
 
+# Stufen (min. Änderungen, min. unique Titel, Confidence) - die erste passende gilt
+_TITLE_TIERS = (
+    (3, 3, lambda changes: min(0.90, 0.5 + (changes / 15.0))),
+    (2, 2, lambda changes: 0.6),
+    (1, 2, lambda changes: 0.4),
+)
+
+
 # JavaScript Code als Konstante (wird bei jeder Navigation injiziert)
 TITLE_OBSERVER_SCRIPT = """
 (() => {
@@ -21,32 +32,59 @@ TITLE_OBSERVER_SCRIPT = """
     
     window.__spa_detection = window.__spa_detection || {};
     
-    // Existierende Changes behalten (Akkumulation über Navigationen)
-    const existingChanges = (window.__spa_detection.title && 
-                            window.__spa_detection.title.changes) || [];
+    // Änderungen sofort an Python melden (page.expose_function) - überlebt Navigationen.
+    // Nur das Top-Level-Fenster meldet, iframe-Titel sind nicht der Seitentitel.
+    const isTopWindow = window === window.top;
+    const emitTitle = (entry) => {
+        if (isTopWindow && typeof window.__spa_title_emit === 'function') {
+            const p = window.__spa_title_emit(entry);
+            if (p && p.catch) p.catch(() => {});
+        }
+    };
     
-    // Aktuellen Titel hinzufügen wenn neu
-    const currentTitle = document.title;
-    const lastTitle = existingChanges.length > 0 ? 
-                      existingChanges[existingChanges.length - 1].title : null;
+    // Existierende Changes behalten (Akkumulation über Navigationen)
+    const existing = window.__spa_detection.title || {};
+    const existingChanges = existing.changes || [];
     
-    if (currentTitle !== lastTitle) {
-        existingChanges.push({ 
-            title: currentTitle, 
-            timestamp: Date.now(),
-            url: location.href,
-            type: 'navigation'
-        });
-    }
+    // Einträge begrenzt im Page-Heap halten: die ersten MAX_TITLE_CHANGES,
+    // total zählt alle Änderungen (wie urlChanges im History-Monitor)
+    const MAX_TITLE_CHANGES = 64;
     
     window.__spa_detection.title = {
         changes: existingChanges,
+        total: existing.total || existingChanges.length,
+        lastTitle: existingChanges.length > 0 ? 
+                   existingChanges[existingChanges.length - 1].title : null,
         observerActive: false,
-        injectionCount: ((window.__spa_detection.title && 
-                         window.__spa_detection.title.injectionCount) || 0) + 1,
+        injectionCount: (existing.injectionCount || 0) + 1,
         injectionTime: Date.now()
     };
     
+    // Aktuellen Titel hinzufügen wenn neu
+    const recordTitle = (type) => {
+        const t = window.__spa_detection.title;
+        const title = document.title;
+        if (title === t.lastTitle) return false;
+        
+        const entry = { 
+            title: title, 
+            timestamp: Date.now(),
+            url: location.href,
+            type: type
+        };
+        t.lastTitle = title;
+        t.total++;
+        if (t.changes.length < MAX_TITLE_CHANGES) t.changes.push(entry);
+        emitTitle(entry);
+        return true;
+    };
+    
+    // Als InitScript (document_start) gibt es noch kein <title> - dann erfasst
+    // startObserver den Ausgangstitel, statt einen leeren Titel zu melden
+    if (document.querySelector('title')) {
+        recordTitle('navigation');
+    }
+    
     const startObserver = () => {
         try {
             const titleElement = document.querySelector('title');
@@ -55,20 +93,13 @@ TITLE_OBSERVER_SCRIPT = """
                 return;
             }
             
+            recordTitle('navigation');
+            
             const observer = new MutationObserver(() => {
                 try {
-                    const newTitle = document.title;
-                    const changes = window.__spa_detection.title.changes;
-                    
                     // Nur hinzufügen wenn sich der Titel wirklich geändert hat
-                    if (changes.length === 0 || changes[changes.length - 1].title !== newTitle) {
-                        changes.push({
-                            title: newTitle,
-                            timestamp: Date.now(),
-                            url: location.href,
-                            type: 'mutation'
-                        });
-                        console.log('[SPA-Detection] Title changed to:', newTitle);
+                    if (recordTitle('mutation')) {
+                        console.log('[SPA-Detection] Title changed to:', document.title);
                     }
                 } catch (e) {
                     console.error('[SPA-Detection] Title tracking error:', e);
@@ -102,14 +133,63 @@ TITLE_OBSERVER_SCRIPT = """
     }
 })();
 """
+# Einmal beim Import verkleinert - wird bei jedem add_init_script/evaluate übertragen
+TITLE_OBSERVER_SCRIPT = minify_script(TITLE_OBSERVER_SCRIPT)
+
+
+TITLE_COLLECT_SCRIPT = """
+() => {
+    if (!window.__spa_detection || !window.__spa_detection.title) {
+        return { 
+            changes: [{ title: document.title, timestamp: Date.now() }],
+            observerActive: false,
+            injectionCount: 0
+        };
+    }
+    return {
+        changes: window.__spa_detection.title.changes,
+        total: window.__spa_detection.title.total,
+        observerActive: window.__spa_detection.title.observerActive,
+        injectionCount: window.__spa_detection.title.injectionCount
+    };
+}
+"""
+
+# Beim Detektor-Setup: aktueller Titel ist der Ausgangstitel (Titelwechsel
+# während des Ladens zählen nicht)
+TITLE_RESET_SCRIPT = """
+() => {
+    const t = window.__spa_detection && window.__spa_detection.title;
+    if (!t) return null;
+    const entry = {
+        title: document.title,
+        timestamp: Date.now(),
+        url: location.href,
+        type: 'navigation'
+    };
+    t.changes = [entry];
+    t.total = 1;
+    t.lastTitle = document.title;
+    return entry;
+}
+"""
 
 
 class TitleChangeDetector:
     """Signal 4: Soft-Navigation + Titeländerung"""
     
+    COLLECT_SCRIPT = TITLE_COLLECT_SCRIPT
+    
+    # Wie MAX_TITLE_CHANGES im Observer-Script: gespeicherte Einträge, gezählt wird alles
+    MAX_TITLE_CHANGES = 64
+    
     def __init__(self):
         self.title_changes = []
-        self._init_script_added = False
+        # Alle Änderungen inkl. der über MAX_TITLE_CHANGES hinaus verworfenen
+        self.title_change_total = 0
+        self._last_title = None
+        # True sobald Änderungen per expose_function direkt in Python ankommen
+        self._push_active = False
         
     async def inject_observer(self, page):
         """
@@ -119,48 +199,74 @@ class TitleChangeDetector:
         jeder Navigation automatisch neu gestartet wird.
         """
         try:
+            # Vor dem Script registrieren, damit schon der initiale Titel gemeldet wird
+            try:
+                await page.expose_function("__spa_title_emit", self._on_title_event)
+                self._push_active = True
+            except Exception as e:
+                logger.debug("Title-Push nicht verfügbar, Fallback auf Polling: %s", e)
+            
             # add_init_script() wird bei JEDER Navigation ausgeführt!
-            if not self._init_script_added:
-                await page.context.add_init_script(TITLE_OBSERVER_SCRIPT)
-                self._init_script_added = True
+            # Lazy: init_script importiert die Detektor-Skripte
+            from .init_script import ensure_init_script
+            if await ensure_init_script(page.context, 'title', TITLE_OBSERVER_SCRIPT):
                 logger.info("Title-Observer als InitScript registriert")
             
             # Auch für die aktuelle Seite injizieren
             try:
                 await page.evaluate(TITLE_OBSERVER_SCRIPT)
             except Exception as e:
-                logger.debug(f"Initiale Title-Injection übersprungen: {e}")
+                logger.debug("Initiale Title-Injection übersprungen: %s", e)
+            
+            # Zählung beginnt mit dem Setup (Observer läuft ggf. schon ab document_start)
+            try:
+                entry = await page.evaluate(TITLE_RESET_SCRIPT)
+            except Exception as e:
+                logger.debug("Title-Reset übersprungen: %s", e)
+                entry = None
+            if entry:
+                self.title_changes = [entry]
+                self.title_change_total = 1
+                self._last_title = entry.get('title')
             
             logger.info("Title-Observer injiziert")
             
         except Exception as e:
             logger.error(f"Fehler beim Injizieren des Title-Observers: {e}")
     
-    async def collect_data(self, page):
-        """Sammelt Title-Changes"""
+    def _on_title_event(self, entry: Dict):
+        """Empfängt Title-Änderungen direkt aus der Page"""
         try:
-            data = await page.evaluate("""
-                () => {
-                    if (!window.__spa_detection || !window.__spa_detection.title) {
-                        return { 
-                            changes: [{ title: document.title, timestamp: Date.now() }],
-                            observerActive: false,
-                            injectionCount: 0
-                        };
-                    }
-                    return {
-                        changes: window.__spa_detection.title.changes,
-                        observerActive: window.__spa_detection.title.observerActive,
-                        injectionCount: window.__spa_detection.title.injectionCount
-                    };
-                }
-            """)
+            if entry.get('type') == 'navigation':
+                # Neues Dokument: wie im Polling-Modus zählt nur dessen Verlauf
+                self.title_changes = [entry]
+                self.title_change_total = 1
+                self._last_title = entry.get('title')
+            elif self.title_change_total == 0 or self._last_title != entry.get('title'):
+                self.title_change_total += 1
+                self._last_title = entry.get('title')
+                if len(self.title_changes) < self.MAX_TITLE_CHANGES:
+                    self.title_changes.append(entry)
+        except Exception as e:
+            logger.debug("Title-Event Fehler: %s", e)
+    
+    async def collect_data(self, page, data: Optional[Dict] = None):
+        """Sammelt Title-Changes (data: bereits geholtes COLLECT_SCRIPT-Ergebnis)"""
+        try:
+            # Push-Modus: Änderungen sind bereits aktuell, kein evaluate nötig
+            if self._push_active:
+                logger.info("Title-Daten: %d Änderungen (Push)", self.title_change_total)
+                return
+            
+            if data is None:
+                data = await page.evaluate(self.COLLECT_SCRIPT)
             
             self.title_changes = data.get('changes', [])
+            self.title_change_total = data.get('total', len(self.title_changes))
             observer_active = data.get('observerActive', False)
             injection_count = data.get('injectionCount', 0)
-            logger.info(f"Title-Daten: {len(self.title_changes)} Änderungen "
-                       f"(Observer aktiv: {observer_active}, Injections: {injection_count})")
+            logger.info("Title-Daten: %d Änderungen (Observer aktiv: %s, Injections: %s)",
+                        self.title_change_total, observer_active, injection_count)
             
         except Exception as e:
             logger.error(f"Fehler beim Sammeln der Title-Daten: {e}")
@@ -168,26 +274,26 @@ class TitleChangeDetector:
     def analyze(self) -> DetectionResult:
         """Analysiert Title-Änderungen"""
         try:
-            unique_titles = list(set([c['title'] for c in self.title_changes]))
-            change_count = len(self.title_changes) - 1
+            # Reihenfolge-erhaltend dedupliziert (ein Durchlauf)
+            unique_titles = dict.fromkeys(c['title'] for c in self.title_changes)
+            unique_count = len(unique_titles)
+            # Zählt auch Änderungen jenseits der gespeicherten Einträge;
+            # ohne erfassten Titel keine negative Änderungszahl
+            change_count = max(0, self.title_change_total - 1)
             
             detected = False
             confidence = 0.0
             
-            if change_count >= 3 and len(unique_titles) >= 3:
-                detected = True
-                confidence = min(0.90, 0.5 + (change_count / 15.0))
-            elif change_count >= 2 and len(unique_titles) >= 2:
-                detected = True
-                confidence = 0.6
-            elif change_count >= 1 and len(unique_titles) >= 2:
-                detected = True
-                confidence = 0.4
+            for min_changes, min_unique, score in _TITLE_TIERS:
+                if change_count >= min_changes and unique_count >= min_unique:
+                    detected = True
+                    confidence = score(change_count)
+                    break
             
             evidence = {
                 'title_change_count': change_count,
-                'unique_titles': len(unique_titles),
-                'titles': unique_titles[:10],
+                'unique_titles': unique_count,
+                'titles': list(islice(unique_titles, 10)),
                 'changes': self.title_changes
             }
             
@@ -196,7 +302,7 @@ class TitleChangeDetector:
                 detected=detected,
                 confidence=confidence,
                 evidence=evidence,
-                description=f"Title-Änderungen: {change_count}, Unique: {len(unique_titles)}"
+                description=f"Title-Änderungen: {change_count}, Unique: {unique_count}"
             )
             
         except Exception as e:
@@ -11,10 +11,25 @@ import asyncio
 import argparse
 import json
 import logging
+import re
 from datetime import datetime
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 
-from analyzer import SPAAnalyzer, SPAAnalysisResult
+from analyzer import SPAAnalyzer, SPAAnalysisResult, RESOURCE_STATE_SCRIPT
+from detectors import register_init_script
+
+
+# Fonts/Medien per URL-Endung blockieren. Das Pattern wird im Browser-Treiber
+# ausgewertet - nur passende Requests kommen überhaupt in Python an
+BLOCKED_ASSET_RE = re.compile(
+    r"\.(?:woff2?|ttf|otf|eot|mp4|webm|ogv|mp3|ogg|wav|m4a)(?:[?#]|$)", re.IGNORECASE
+)
+
+# Bilder deaktiviert Firefox selbst, ganz ohne Route-Handler
+FIREFOX_USER_PREFS = {
+    'permissions.default.image': 2,
+    'media.autoplay.default': 5,
+}
 
 
 # Logging Setup
@@ -39,9 +54,11 @@ def setup_logging(verbose: bool = False):
         log_dir.mkdir(exist_ok=True)
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # delay=True: Datei wird erst beim ersten Record geöffnet
         file_handler = logging.FileHandler(
             log_dir / f'spa_detection_{timestamp}.log',
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True
         )
         file_handler.setLevel(logging.DEBUG)
         file_formatter = logging.Formatter(
@@ -54,16 +71,31 @@ def setup_logging(verbose: bool = False):
         print(f"⚠️  Konnte Log-Datei nicht erstellen: {e}")
 
 
+def load_urls(url_arg: str) -> list:
+    """URL oder Datei mit URLs (eine pro Zeile, '#' = Kommentar) → Liste der URLs"""
+    url_path = Path(url_arg)
+    if not url_path.is_file():
+        return [url_arg]
+    
+    # Einmal komplett lesen und splitten statt zeilenweise zu iterieren,
+    # jede Zeile nur einmal strippen
+    lines = url_path.read_text(encoding='utf-8').splitlines()
+    urls = [url for line in lines if not line.startswith('#') and (url := line.strip())]
+    logging.getLogger(__name__).info("📄 %s URLs aus Datei geladen: %s\n", len(urls), url_path)
+    return urls
+
+
 class SPADetectionTool:
     """Haupt-CLI Tool mit robustem Error-Handling"""
     
-    def __init__(self, headless: bool = False, timeout: int = 30000):
+    def __init__(self, headless: bool = False, timeout: int = 30000, idle_ms: int = 300):
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
         self.headless = headless
         self.timeout = timeout
+        self.idle_ms = idle_ms
         self.logger = logging.getLogger(__name__)
     
     async def __aenter__(self):
@@ -85,37 +117,38 @@ class SPADetectionTool:
                     '--disable-blink-features=AutomationControlled',
                     '--disable-dev-shm-usage',
                 ],
+                firefox_user_prefs=FIREFOX_USER_PREFS,
             )
             
-            # Context mit realistischen Einstellungen
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
-                locale='de-DE',
-                timezone_id='Europe/Berlin',
-                accept_downloads=False,
-                ignore_https_errors=True,
-            )
-            
-            # Setze längere Timeouts
-            self.context.set_default_timeout(self.timeout)
-            self.context.set_default_navigation_timeout(self.timeout)
-            
-            # Erstelle Page
-            self.page = await self.context.new_page()
-            
-            # Blockiere unnötige Ressourcen für Speed
-            await self.page.route("**/*", lambda route: (
-                route.abort() if route.request.resource_type in ["image", "media", "font"] 
-                else route.continue_()
-            ))
-            
             self.logger.info("✅ Browser bereit\n")
             
         except Exception as e:
-            self.logger.error(f"❌ Browser-Setup fehlgeschlagen: {e}")
+            self.logger.error("❌ Browser-Setup fehlgeschlagen: %s", e)
             raise
     
+    async def _new_context(self):
+        """Erstellt einen Browser-Context mit realistischen Einstellungen"""
+        context = await self.browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+            locale='de-DE',
+            timezone_id='Europe/Berlin',
+            accept_downloads=False,
+            ignore_https_errors=True,
+        )
+        
+        # Setze längere Timeouts
+        context.set_default_timeout(self.timeout)
+        context.set_default_navigation_timeout(self.timeout)
+        
+        # Blockiere unnötige Ressourcen für Speed (gilt für alle Pages im Context)
+        await context.route(BLOCKED_ASSET_RE, lambda route: route.abort())
+        
+        # Detektor-Hooks vor der ersten Navigation installieren (ab document_start);
+        # die Zählung startet erst mit dem Detektor-Setup nach dem Laden
+        await register_init_script(context)
+        return context
+    
     async def cleanup(self):
         """Räumt Browser-Ressourcen auf"""
         try:
@@ -129,40 +162,41 @@ class SPADetectionTool:
                 await self.playwright.stop()
             self.logger.info("✅ Browser bereinigt")
         except Exception as e:
-            self.logger.error(f"Cleanup-Fehler: {e}")
+            self.logger.error("Cleanup-Fehler: %s", e)
     
-    async def navigate_to_url(self, url: str, retries: int = 2) -> bool:
+    async def navigate_to_url(self, url: str, retries: int = 2, page=None) -> bool:
         """
-        Navigiert zur URL mit Retry-Logik
+        Navigiert zur URL mit Retry-Logik (page: Default self.page)
         Returns: True bei Erfolg
         """
+        page = page or self.page
         for attempt in range(retries + 1):
             try:
-                self.logger.info(f"🌐 Lade URL: {url} (Versuch {attempt + 1}/{retries + 1})")
+                self.logger.info("🌐 Lade URL: %s (Versuch %s/%s)", url, attempt + 1, retries + 1)
                 
-                response = await self.page.goto(
+                response = await page.goto(
                     url,
-                    wait_until='networkidle',
+                    wait_until='domcontentloaded',
                     timeout=self.timeout
                 )
                 
                 if response and response.status >= 400:
-                    self.logger.warning(f"⚠️  HTTP Status {response.status}")
+                    self.logger.warning("⚠️  HTTP Status %s", response.status)
                 
                 self.logger.info("✅ Seite geladen\n")
                 return True
                 
             except PlaywrightTimeout:
-                self.logger.warning(f"⏱️  Timeout bei Versuch {attempt + 1}")
+                self.logger.warning("⏱️  Timeout bei Versuch %s", attempt + 1)
                 if attempt < retries:
+                    # Timeout hat bereits gewartet - sofort erneut versuchen
                     self.logger.info("🔄 Versuche erneut...")
-                    await asyncio.sleep(2)
                 else:
                     self.logger.error("❌ Alle Versuche fehlgeschlagen (Timeout)")
                     return False
                     
             except Exception as e:
-                self.logger.error(f"❌ Navigation fehlgeschlagen: {e}")
+                self.logger.error("❌ Navigation fehlgeschlagen: %s", e)
                 if attempt < retries:
                     await asyncio.sleep(2)
                 else:
@@ -170,11 +204,46 @@ class SPADetectionTool:
         
         return False
     
+    async def _wait_until_quiet(self, page, max_ms: int, poll_ms: int = 200):
+        """
+        Wartet begrenzt, bis die Seite zur Ruhe kommt.
+        
+        Statt 'networkidle' (hängt bei Long-Polling/Analytics oft bis zum Timeout):
+        'load' mit höchstens 5s, danach bis seit idle_ms keine Ressource mehr
+        abgeschlossen wurde - höchstens max_ms. Bereits ruhige Seiten kosten so
+        nur einen Poll statt der vollen Wartezeit (idle_ms <= 0: nur 'load').
+        """
+        try:
+            await page.wait_for_load_state('load', timeout=min(5000, self.timeout))
+        except PlaywrightTimeout:
+            self.logger.debug("'load' nicht erreicht - fahre mit DOMContentLoaded fort")
+        
+        quiet_ms = self.idle_ms
+        if quiet_ms <= 0:
+            return
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_ms / 1000
+        try:
+            while True:
+                _, quiet, complete = await page.evaluate(RESOURCE_STATE_SCRIPT)
+                if complete and quiet >= quiet_ms:
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                await asyncio.sleep(min(poll_ms / 1000, remaining))
+        except Exception as e:
+            # z.B. Navigation während des Wartens - restliche Zeit einfach abwarten
+            self.logger.debug("Ruhe-Erkennung abgebrochen: %s", e)
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+    
     async def analyze_url(self, url: str, 
                          interact: bool = True,
                          interaction_strategy: str = "smart",
                          max_interactions: int = 10,
-                         wait_time: int = 3) -> SPAAnalysisResult:
+                         wait_time: int = 3,
+                         page=None) -> SPAAnalysisResult:
         """
         Analysiert eine URL auf SPA-Eigenschaften
         
@@ -183,26 +252,28 @@ class SPADetectionTool:
             interact: Interaktionen durchführen
             interaction_strategy: "smart", "random_walk" oder "navigation"
             max_interactions: Anzahl Interaktionen
-            wait_time: Wartezeit nach Load
+            wait_time: Maximale Wartezeit nach Load (Sekunden)
+            page: Zu verwendende Page (Default: self.page, beim ersten Aufruf angelegt -
+                  der Batch-Modus bringt eigene Contexts mit)
         """
         try:
+            if page is None:
+                if self.page is None:
+                    self.context = await self._new_context()
+                    self.page = await self.context.new_page()
+                page = self.page
+            
             # Navigiere zur URL
-            success = await self.navigate_to_url(url)
+            success = await self.navigate_to_url(url, page=page)
             if not success:
-                self.logger.error(f"❌ Konnte {url} nicht laden")
+                self.logger.error("❌ Konnte %s nicht laden", url)
                 return None
             
-            # Server-HTML abrufen (für DOM-Detector)
-            server_html = await self.page.content()
-            
-            # Warte auf initiales Rendering
-            await asyncio.sleep(wait_time)
+            # Warte auf initiales Rendering (wait_time nur noch als Obergrenze)
+            await self._wait_until_quiet(page, wait_time * 1000)
             
             # Erstelle Analyzer
-            analyzer = SPAAnalyzer(self.page)
-            
-            # Server-HTML an DOM-Detector übergeben
-            analyzer.dom_detector.record_server_html(server_html)
+            analyzer = SPAAnalyzer(page)
             
             # Führe Analyse durch
             result = await analyzer.analyze(
@@ -214,42 +285,63 @@ class SPADetectionTool:
             return result
             
         except Exception as e:
-            self.logger.error(f"❌ Analyse-Fehler für {url}: {e}")
-            import traceback
-            traceback.print_exc()
+            # Traceback nur mit --verbose - Formatieren liest Quelltext-Zeilen von Disk
+            self.logger.error("❌ Analyse-Fehler für %s: %s", url, e,
+                              exc_info=self.logger.isEnabledFor(logging.DEBUG))
             return None
     
-    async def analyze_multiple_urls(self, urls: list, **kwargs) -> dict:
-        """Analysiert mehrere URLs nacheinander"""
-        results = {}
+    async def analyze_multiple_urls(self, urls: list, concurrency: int = 1, **kwargs) -> dict:
+        """
+        Analysiert mehrere URLs mit bis zu `concurrency` parallelen Workern.
         
-        for i, url in enumerate(urls, 1):
-            print(f"\n{'='*80}")
-            print(f"📊 Analyse {i}/{len(urls)}: {url}")
-            print(f"{'='*80}\n")
-            
+        Jeder Worker hält einen eigenen Browser-Context über alle seine URLs
+        (InitScripts und Route bleiben registriert), pro URL nur eine frische Page.
+        Der Browser selbst wird geteilt - Seitenladezeiten überlappen sich so,
+        statt sich aufzusummieren.
+        """
+        results = [None] * len(urls)
+        pending = iter(enumerate(urls))
+        
+        async def worker():
+            context = await self._new_context()
             try:
-                result = await self.analyze_url(url, **kwargs)
-                results[url] = result
-                
-                if result:
-                    print(f"\n✅ Analyse abgeschlossen: {result.verdict}")
-                else:
-                    print(f"\n❌ Analyse fehlgeschlagen")
-                
-            except Exception as e:
-                self.logger.error(f"❌ Fehler bei {url}: {e}")
-                results[url] = None
-            
-            # Neue Seite für nächste URL
-            if i < len(urls):
+                # Gemeinsamer Iterator: jeder Worker holt sich die nächste freie URL
+                for index, url in pending:
+                    print(f"\n{'='*80}")
+                    print(f"📊 Analyse {index + 1}/{len(urls)}: {url}")
+                    print(f"{'='*80}\n")
+                    
+                    page = None
+                    try:
+                        # Frische Page pro URL - Detector-Listener und exposed
+                        # Functions hängen an der Page und dürfen nicht weiterleben
+                        page = await context.new_page()
+                        result = await self.analyze_url(url, page=page, **kwargs)
+                        results[index] = result
+                        
+                        if result:
+                            print(f"\n✅ Analyse abgeschlossen ({url}): {result.verdict}")
+                        else:
+                            print(f"\n❌ Analyse fehlgeschlagen ({url})")
+                        
+                    except Exception as e:
+                        self.logger.error("❌ Fehler bei %s: %s", url, e)
+                    
+                    finally:
+                        if page:
+                            try:
+                                await page.close()
+                            except Exception as e:
+                                self.logger.error("Fehler beim Schließen der Page: %s", e)
+            finally:
                 try:
-                    await self.page.close()
-                    self.page = await self.context.new_page()
+                    await context.close()
                 except Exception as e:
-                    self.logger.error(f"Fehler beim Erstellen neuer Page: {e}")
+                    self.logger.error("Fehler beim Schließen des Contexts: %s", e)
         
-        return results
+        workers = min(max(1, concurrency), len(urls))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return dict(zip(urls, results))
     
     @staticmethod
     def save_report(result: SPAAnalysisResult, output_path: str):
@@ -266,7 +358,47 @@ class SPADetectionTool:
             print(f"\n💾 Report gespeichert: {output_file}")
             
         except Exception as e:
-            logging.error(f"❌ Report-Speicherung fehlgeschlagen: {e}")
+            logging.error("❌ Report-Speicherung fehlgeschlagen: %s", e)
+    
+    @staticmethod
+    def save_combined_report(results: dict, output_path: str, total_urls: int):
+        """
+        Speichert den Batch-Report als JSON.
+        
+        Die Einzel-Reports werden nacheinander exportiert und geschrieben, statt
+        vorher ein Gesamt-Dict aller Reports aufzubauen - der Speicherbedarf
+        bleibt bei einem Report. Das Format entspricht json.dump(indent=2).
+        """
+        try:
+            output_file = Path(output_path)
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            
+            header = {
+                "analyzed_at": datetime.now().isoformat(),
+                "total_urls": total_urls,
+                "spa_detected": sum(1 for r in results.values() if r and r.is_spa),
+            }
+            
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write("{\n")
+                for key, value in header.items():
+                    f.write(f'  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n')
+                f.write('  "results": {')
+                
+                separator = "\n"
+                for url, r in results.items():
+                    report = SPAAnalyzer.export_report(r) if r else {"error": "Analysis failed"}
+                    # Verschachtelung unter "results" = 4 Leerzeichen Einrückung
+                    body = json.dumps(report, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                    f.write(f"{separator}    {json.dumps(url, ensure_ascii=False)}: {body}")
+                    separator = ",\n"
+                
+                f.write("\n  }\n}" if results else "}\n}")
+            
+            print(f"\n💾 Combined Report gespeichert: {output_file}")
+            
+        except Exception as e:
+            logging.error("❌ Report-Speicherung fehlgeschlagen: %s", e)
     
     @staticmethod
     def print_summary(results: dict):
@@ -275,9 +407,22 @@ class SPADetectionTool:
         print("📊 ZUSAMMENFASSUNG")
         print(f"{'='*80}\n")
         
+        # Ein Durchlauf: Zähler und Detail-Zeilen zusammen sammeln
         total = len(results)
-        spa_count = sum(1 for r in results.values() if r and r.is_spa)
-        failed = sum(1 for r in results.values() if r is None)
+        spa_count = failed = 0
+        details = []
+        for url, result in results.items():
+            if result:
+                if result.is_spa:
+                    spa_count += 1
+                    status = "✅ SPA"
+                else:
+                    status = "❌ NO SPA"
+                confidence = f"{result.confidence:.0%}"
+                details.append(f"  {status:12} | {confidence:5} | {url}")
+            else:
+                failed += 1
+                details.append(f"  ❌ ERROR      | N/A   | {url}")
         
         print(f"Gesamt analysiert: {total}")
         print(f"SPAs erkannt: {spa_count}")
@@ -285,13 +430,8 @@ class SPADetectionTool:
         print(f"Fehlgeschlagen: {failed}")
         
         print("\n📋 Details:\n")
-        for url, result in results.items():
-            if result:
-                status = "✅ SPA" if result.is_spa else "❌ NO SPA"
-                confidence = f"{result.confidence:.0%}"
-                print(f"  {status:12} | {confidence:5} | {url}")
-            else:
-                print(f"  ❌ ERROR      | N/A   | {url}")
+        if details:
+            print("\n".join(details))
         
         print(f"\n{'='*80}")
 
@@ -308,6 +448,7 @@ Beispiele:
   %(prog)s https://vuejs.org --strategy navigation --max-actions 15
   %(prog)s https://angular.io --output report.json --verbose
   %(prog)s urls.txt --headless --output batch_report.json
+  %(prog)s urls.txt --headless --concurrency 4
   %(prog)s https://example.com --timeout 60000 --wait-time 5
         """
     )
@@ -355,7 +496,19 @@ Beispiele:
         '--wait-time',
         type=int,
         default=3,
-        help='Wartezeit nach Load in Sekunden (default: 3)'
+        help='Maximale Wartezeit nach Load in Sekunden (default: 3)'
+    )
+    browser_group.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Anzahl parallel analysierter URLs bei URL-Dateien (default: 1)'
+    )
+    browser_group.add_argument(
+        '--idle-ms',
+        type=int,
+        default=300,
+        help='Ruhe-Intervall der Idle-Erkennung nach dem Load in ms, 0 = aus (default: 300)'
     )
     
     # Output Options
@@ -389,29 +542,30 @@ Beispiele:
         print("🔍 SPA DETECTION TOOL v2.0")
         print("="*80 + "\n")
     
-    # Parse URLs
-    urls = []
-    url_path = Path(args.url)
-    
-    if url_path.is_file():
-        try:
-            with open(url_path, 'r', encoding='utf-8') as f:
-                urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-            logger.info(f"📄 {len(urls)} URLs aus Datei geladen: {url_path}\n")
-        except Exception as e:
-            logger.error(f"❌ Fehler beim Lesen der URL-Datei: {e}")
-            sys.exit(1)
-    else:
-        urls = [args.url]
-    
-    if not urls:
-        logger.error("❌ Keine URLs zum Analysieren gefunden")
-        sys.exit(1)
-    
     # Führe Analyse durch
     try:
-        async with SPADetectionTool(headless=args.headless, timeout=args.timeout) as tool:
-            await tool.setup_browser()
+        async with SPADetectionTool(headless=args.headless, timeout=args.timeout,
+                                    idle_ms=args.idle_ms) as tool:
+            # Firefox-Start (1-2s) läuft im Hintergrund, während die URL-Liste
+            # in einem Thread gelesen wird
+            setup_task = asyncio.create_task(tool.setup_browser())
+            try:
+                try:
+                    urls = await asyncio.to_thread(load_urls, args.url)
+                except Exception as e:
+                    logger.error("❌ Fehler beim Lesen der URL-Datei: %s", e)
+                    sys.exit(1)
+                
+                if not urls:
+                    logger.error("❌ Keine URLs zum Analysieren gefunden")
+                    sys.exit(1)
+            except BaseException:
+                # Abbruch vor der Analyse: Browser-Start nicht weiterlaufen lassen
+                setup_task.cancel()
+                await asyncio.gather(setup_task, return_exceptions=True)
+                raise
+            
+            await setup_task
             
             if len(urls) == 1:
                 # Einzelne URL
@@ -438,6 +592,7 @@ Beispiele:
                 # Mehrere URLs
                 results = await tool.analyze_multiple_urls(
                     urls,
+                    concurrency=args.concurrency,
                     interact=not args.no_interact,
                     interaction_strategy=args.strategy,
                     max_interactions=args.max_actions,
@@ -450,27 +605,7 @@ Beispiele:
                 
                 # Speichere Combined Report
                 if args.output:
-                    try:
-                        combined = {
-                            "analyzed_at": datetime.now().isoformat(),
-                            "total_urls": len(urls),
-                            "spa_detected": sum(1 for r in results.values() if r and r.is_spa),
-                            "results": {
-                                url: SPAAnalyzer.export_report(r) if r else {"error": "Analysis failed"}
-                                for url, r in results.items()
-                            }
-                        }
-                        
-                        output_file = Path(args.output)
-                        output_file.parent.mkdir(parents=True, exist_ok=True)
-                        
-                        with open(output_file, 'w', encoding='utf-8') as f:
-                            json.dump(combined, f, indent=2, ensure_ascii=False)
-                        
-                        print(f"\n💾 Combined Report gespeichert: {output_file}")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Report-Speicherung fehlgeschlagen: {e}")
+                    tool.save_combined_report(results, args.output, total_urls=len(urls))
                 
                 # Exit-Code: 0 wenn mindestens eine SPA
                 spa_found = any(r and r.is_spa for r in results.values())
@@ -481,10 +616,7 @@ Beispiele:
         sys.exit(130)
     
     except Exception as e:
-        logger.error(f"\n❌ KRITISCHER FEHLER: {e}")
-        if args.verbose:
-            import traceback
-            traceback.print_exc()
+        logger.error("\n❌ KRITISCHER FEHLER: %s", e, exc_info=args.verbose)
         sys.exit(1)
 
 